@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse
+
+from profiler import PROFILE_HEADER, list_profiles, profile_path, verify_token
+
+
+def require_profile_token(request: Request):
+    # Same signed token that opts a request into profiling (see profiler.py)
+    if not verify_token(request.headers.get(PROFILE_HEADER)):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+router = APIRouter(
+    prefix="/admin/profiles",
+    tags=["admin"],
+    dependencies=[Depends(require_profile_token)]
+)
+
+
+@router.get("/")
+def get_profiles():
+    return list_profiles()
+
+
+@router.get("/{name}")
+def download_profile(name: str):
+    path = profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
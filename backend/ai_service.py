@@ -1,16 +1,61 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
+import asyncio
+import logging
 import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import httpx
 from dotenv import load_dotenv
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import AIPlanJob
+from metrics import AI_REQUEST_SECONDS, AI_REQUEST_FAILURES
+from plan_cache import make_cache_key, get_cached_plan, store_plan
 
 load_dotenv() # Actually load the .env file
 
-client = OpenAI(api_key = os.getenv("OPENAI_API_KEY"))
+# Point at any OpenAI-compatible server, e.g. openai_stub.py during development
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 
-def generate_learning_plan(skills):
+AI_MODEL = os.getenv("AI_MODEL", "gpt-4o-mini")
 
-    try:
+AI_TEMPERATURE = 0.6
+
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", "3"))
+
+AI_READ_TIMEOUT = float(os.getenv("AI_READ_TIMEOUT", "20"))
+
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+
+AI_JOB_TTL_SECONDS = 600
+
+# Generations running longer are abandoned and the job fails with the fallback plan
+AI_JOB_TIMEOUT_SECONDS = float(os.getenv("AI_JOB_TIMEOUT_SECONDS", "120"))
+
+AI_JOB_POLL_SECONDS = 0.5
+
+FALLBACK_PLAN = "⚠ AI unavailable. Focus on completing 1 task per skill daily."
+
+logger = logging.getLogger("ai_service")
+
+_timeout = httpx.Timeout(AI_READ_TIMEOUT, connect=AI_CONNECT_TIMEOUT)
+
+async_client = AsyncOpenAI(
+    api_key = os.getenv("OPENAI_API_KEY"),
+    base_url = OPENAI_BASE_URL,
+    timeout = _timeout,
+    max_retries = 1
+)
 
-        prompt = f"""
+
+SYSTEM_PROMPT = "You are a productivity coach."
+
+PROMPT_TEMPLATE = """
 
 User skills and progress:
 
@@ -19,28 +64,252 @@ User skills and progress:
 Create a 7-day focused learning & productivity plan.
 Keep it short,actionable, and motivating.
 """
-        
 
+# Everything besides the skills that shapes a plan; part of the cache key
+MODEL_PARAMS = {
+    "model": AI_MODEL,
+    "temperature": AI_TEMPERATURE,
+    "system": SYSTEM_PROMPT,
+    "template": PROMPT_TEMPLATE
+}
+
+
+def _build_messages(skills):
+
+    prompt = PROMPT_TEMPLATE.format(skills=skills)
+
+    return [
+
+         {"role":"system","content":SYSTEM_PROMPT},
+
+         {"role":"user","content": prompt}
+    ]
+
+
+def _record_ai_request(started: float, error: Optional[Exception] = None) -> None:
+
+    AI_REQUEST_SECONDS.observe(time.perf_counter() - started, outcome="error" if error else "ok")
+
+    if error is not None:
+
+        AI_REQUEST_FAILURES.inc(error=type(error).__name__)
+
+
+# Limits concurrent upstream calls from this process
+_upstream_slots = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+
+
+async def _request_plan(skills):
+
+    async with _upstream_slots:
+
+        started = time.perf_counter()
+
+        try:
+
+            response = await async_client.chat.completions.create(
+
+                model=AI_MODEL,
+
+                messages = _build_messages(skills),
+
+                temperature=AI_TEMPERATURE,
+            )
+
+        except Exception as e:
+
+            _record_ai_request(started, e)
+
+            raise
+
+        _record_ai_request(started)
+
+    return response.choices[0].message.content
+
+
+async def generate_learning_plan_async(skills):
+
+    try:
+
+        return await _request_plan(skills)
+
+    except Exception:
+
+        return FALLBACK_PLAN
+
+
+# -------------------------------
+# Cached plans (see plan_cache.py)
+# -------------------------------
+async def get_learning_plan_async(db: AsyncSession, user_id: int, skills) -> str:
+    """Cached plan, or a newly generated one.
+
+    On a cache miss ``db`` is closed before waiting on OpenAI, so its
+    pooled connection is not held for the whole generation; callers must
+    have finished their own reads and writes.
+    """
+    cache_key = make_cache_key(skills, MODEL_PARAMS)
+
+    plan = await db.run_sync(get_cached_plan, user_id, cache_key)
+
+    if plan is not None:
+
+        return plan
+
+    await db.close()
+
+    plan = await generate_learning_plan_async(skills)
+
+    if plan != FALLBACK_PLAN:
+
+        await _store_plan(user_id, cache_key, plan)
+
+    return plan
+
+
+async def _store_plan(user_id: int, cache_key: str, plan: str):
+
+    # A session of its own, checked out only for the write
+    async with AsyncSessionLocal() as db:
+
+        await db.run_sync(store_plan, user_id, cache_key, plan)
+
+
+# -------------------------------
+# Background plan jobs
+# -------------------------------
+# Jobs are rows in ai_plan_jobs, so a poll served by any worker process
+# finds them. The worker that starts a job runs it; pollers in that worker
+# wake on a local event, pollers elsewhere re-read the row every
+# AI_JOB_POLL_SECONDS.
+
+# A job still pending this long after it started lost its worker
+_ABANDONED_AFTER_SECONDS = AI_JOB_TIMEOUT_SECONDS + 30
+
+# Jobs running in this process: job_id -> (task, finished event)
+_running_jobs = {}
+
+
+def _age_seconds(created_at: datetime) -> float:
+    # SQLite hands back naive UTC datetimes
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - created_at).total_seconds()
+
+
+def _job_dict(job: AIPlanJob) -> dict:
+    if job.status == "pending" and _age_seconds(job.created_at) > _ABANDONED_AFTER_SECONDS:
+        return {"job_id": job.id, "status": "failed", "result": FALLBACK_PLAN}
+    return {"job_id": job.id, "status": job.status, "result": job.result}
+
+
+async def _run_job(job_id: str, user_id: int, skills, cache_key: str):
+
+    try:
+
+        result = await asyncio.wait_for(_request_plan(skills), AI_JOB_TIMEOUT_SECONDS)
+
+        status = "done"
+
+    except Exception:
+
+        result, status = FALLBACK_PLAN, "failed"
+
+    if status == "done":
+
+        try:
+
+            await _store_plan(user_id, cache_key, result)
+
+        except Exception:
+
+            # The plan is still delivered; only caching it failed
+            logger.exception("Could not cache the plan of job %s", job_id)
+
+    try:
+
+        async with AsyncSessionLocal() as db:
+
+            await db.execute(update(AIPlanJob).where(AIPlanJob.id == job_id).values(
+                status=status, result=result
+            ))
+
+            await db.commit()
+
+    except Exception:
+
+        # Pollers report the job as failed once it counts as abandoned
+        logger.exception("Could not record the result of job %s", job_id)
+
+    finally:
+
+        _running_jobs.pop(job_id)[1].set()
+
+
+async def start_plan_job(db: AsyncSession, user_id: int, skills) -> dict:
+    """Start generating a plan in the background.
+
+    A cached plan comes back as an already finished job, and a user with a
+    job still in flight gets that job back instead of a new one.
+    """
+    now = datetime.now(timezone.utc)
+
+    await db.execute(delete(AIPlanJob).where(
+        AIPlanJob.created_at < now - timedelta(seconds=AI_JOB_TTL_SECONDS)
+    ))
+
+    in_flight = (await db.execute(select(AIPlanJob).where(
+        AIPlanJob.user_id == user_id,
+        AIPlanJob.status == "pending",
+        AIPlanJob.created_at >= now - timedelta(seconds=_ABANDONED_AFTER_SECONDS)
+    ).limit(1))).scalars().first()
+
+    if in_flight is not None:
+        await db.commit()
+        return _job_dict(in_flight)
+
+    cache_key = make_cache_key(skills, MODEL_PARAMS)
+    cached = await db.run_sync(get_cached_plan, user_id, cache_key)
+
+    job = AIPlanJob(
+        id=uuid.uuid4().hex, user_id=user_id, created_at=now,
+        status="pending" if cached is None else "done", result=cached
+    )
+    db.add(job)
+    await db.commit()
+
+    if cached is None:
+        task = asyncio.get_running_loop().create_task(_run_job(job.id, user_id, skills, cache_key))
+        _running_jobs[job.id] = (task, asyncio.Event())
 
+    return _job_dict(job)
 
-        response = client.chat.completions.create(
 
-            model="gpt-4o-mini",
+async def _load_job(job_id: str, user_id: int) -> Optional[dict]:
+    async with AsyncSessionLocal() as db:
+        job = await db.get(AIPlanJob, job_id)
+        return _job_dict(job) if job is not None and job.user_id == user_id else None
 
-            messages = [
 
-                 {"role":"system","content":"You are a productivity coach."},
-                 
-                 {"role":"user","content": prompt}
-            ],
-            temperature=0.6,
-        )
+async def wait_for_job(job_id: str, user_id: int, wait: float = 0) -> Optional[dict]:
+    """Look up a user's job, long-polling up to ``wait`` seconds for it to finish.
 
+    Each read uses a short-lived session, so no connection is held while waiting.
+    """
+    deadline = time.monotonic() + wait
 
+    while True:
+        job = await _load_job(job_id, user_id)
+        remaining = deadline - time.monotonic()
+        if job is None or job["status"] != "pending" or remaining <= 0:
+            return job
 
-        return response.choices[0].message.content
-    
-    except Exception as e:
+        running = _running_jobs.get(job_id)
+        if running is None:
+            await asyncio.sleep(min(AI_JOB_POLL_SECONDS, remaining))
+            continue
 
-          # 🔁 Fallback when GPT fails
-        return "⚠ AI unavailable. Focus on completing 1 task per skill daily."
\ No newline at end of file
+        try:
+            await asyncio.wait_for(running[1].wait(), timeout=remaining)
+        except asyncio.TimeoutError:
+            pass
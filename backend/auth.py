@@ -1,11 +1,13 @@
 from fastapi import APIRouter,Depends, HTTPException
 from schemas import UserRegister, UserLogin
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from passlib.context import CryptContext
-from database import get_db
+from database import get_async_db
 from models import User
 from jose import jwt
+from password_service import hash_password_async, verify_password_async
+from rank_index import rank_index
 import os
 from dotenv import load_dotenv
 
@@ -13,23 +15,16 @@ load_dotenv()
 
 router = APIRouter(prefix="/auth",tags=["auth"])
 
-pwd_context = CryptContext(schemes=["bcrypt"],deprecated="auto")
-
 SECRET_KEY = os.getenv("SECRET_KEY", "fallback-secret-key-change-in-production")
 
 ALGORITHM = "HS256"
 
 
-
-def hashed_password(password):
-
-    return pwd_context.hash(password)
-
 @router.post("/register")
 
-def register(user:UserRegister,db: Session=Depends(get_db)):
+async def register(user:UserRegister,db: AsyncSession=Depends(get_async_db)):
 
-    existing = db.query(User).filter(User.email==user.email).first()
+    existing = (await db.execute(select(User).where(User.email==user.email))).scalars().first()
 
     if existing:
 
@@ -40,15 +35,17 @@ def register(user:UserRegister,db: Session=Depends(get_db)):
 
         email=user.email,
 
-        hashed_password=hashed_password(user.password)
+        hashed_password=await hash_password_async(user.password)
     
     )
 
     db.add(new_user)
 
-    db.commit()
+    await db.commit()
+
+    await db.refresh(new_user)
 
-    db.refresh(new_user)
+    rank_index.update(new_user.id, new_user.xp_points)
 
 
     return {"message": "User registered successfully"}
@@ -57,13 +54,26 @@ def register(user:UserRegister,db: Session=Depends(get_db)):
 @router.post("/login")
 
 
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == credentials.email).first()
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User).where(User.email == credentials.email))).scalars().first()
     
-    if not user or not pwd_context.verify(credentials.password, user.hashed_password):
+    if not user:
+
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    valid, new_hash = await verify_password_async(credentials.password, user.hashed_password)
+
+    if not valid:
 
         raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    if new_hash:
+
+        # Stored hash used an outdated bcrypt cost
+        user.hashed_password = new_hash
+
+        await db.commit()
     
-    token = jwt.encode({"sub": user.email}, SECRET_KEY, algorithm=ALGORITHM)
+    token = jwt.encode({"sub": user.email, "uid": user.id}, SECRET_KEY, algorithm=ALGORITHM)
 
     return {"access_token": token}
\ No newline at end of file
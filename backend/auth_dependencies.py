@@ -1,24 +1,43 @@
 from fastapi import Depends,HTTPException,status
 from fastapi.security import HTTPBearer , HTTPAuthorizationCredentials
 
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models import User
 from auth_utils import decode_access_token
+from principal_cache import principal_cache
 
 
 security = HTTPBearer()
 
-def get_current_user(
+async def get_current_user(
         
         credentials: HTTPAuthorizationCredentials = Depends(security),
 
-        db:Session = Depends(get_db)
+        db:AsyncSession = Depends(get_async_db)
 ):
     
 
     token = credentials.credentials
 
+    principal = principal_cache.get(token)
+
+
+    if principal:
+
+        # Verified recently: skip JWT decoding, load by primary key
+        user = await db.get(User, principal.user_id)
+
+        if not user or user.email != principal.email:
+
+            principal_cache.invalidate_user(principal.user_id)
+
+            raise HTTPException(status_code=401,detail="User not found")
+
+        return user
+
+
     payload = decode_access_token(token)
 
 
@@ -34,11 +53,27 @@ def get_current_user(
 
     email = payload.get("sub")
 
+    user_id = payload.get("uid")
 
-    user = db.query(User).filter(User.email ==email).first()
+
+    if user_id is not None:
+
+        user = await db.get(User, user_id)
+
+        if user and user.email != email:
+
+            user = None
+
+    else:
+
+        # Tokens issued before "uid" was added only carry the email
+        user = (await db.execute(select(User).where(User.email ==email))).scalars().first()
 
     if not user:
 
         raise HTTPException(status_code=401,detail="User not found")
     
-    return user
\ No newline at end of file
+
+    principal_cache.set(token, user.id, user.email, payload.get("exp"))
+
+    return user
@@ -0,0 +1,862 @@
+"""
+Benchmark - Per-endpoint latency, throughput and SQL query counts
+
+Seeds a synthetic SQLite database at a chosen scale, then drives every
+router mounted in main.py in-process through an ASGI client (no network,
+no server) and reports p50/p95/p99 latency, requests per second and SQL
+statements per request (see query_stats.py) for each endpoint as JSON.
+
+Seeded databases are cached in ``--data-dir`` by scale and copied before
+every run, so write endpoints always start from the same data and results
+from different commits are comparable:
+
+    python benchmark.py --scale small > before.json
+    python benchmark.py --scale small --baseline before.json
+    python benchmark.py --scale medium wide --requests 100 --only dashboard
+
+Endpoints backed by OpenAI are skipped; they measure the model, not this
+service.
+
+``--serialization`` skips the database and measures CPU time spent turning
+10k-row skill, task and heatmap lists into response bodies, on FastAPI's
+default path and on the fast_json.py path:
+
+    python benchmark.py --serialization --rows 10000
+
+``--auth`` measures get_current_user alone against a users-only database:
+decoding the JWT and looking the user up by email (before principal_cache),
+decoding and looking up by primary key (a cache miss), and a cache hit:
+
+    python benchmark.py --auth --users 20000
+
+``--rank-index`` measures the leaderboard's rank index against a users-only
+database (1M users by default): a full rebuild run inline on the event loop,
+as requests used to, and in the background thread, with the longest event
+loop stall each causes, plus rank, top-10 and neighbourhood lookups:
+
+    python benchmark.py --rank-index --users 1000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Optional
+
+
+# (users, skills per user, tasks per skill)
+SCALES = {
+    "small": (100, 10, 10),        # 10k tasks
+    "medium": (1_000, 10, 20),     # 200k tasks
+    "wide": (1_000, 500, 2),       # 500 skills per user, 1M tasks
+    "large": (100_000, 10, 10),    # 10M tasks
+}
+
+BENCH_PASSWORD = "bench-pass"
+
+SEED = 42
+
+SEED_CHUNK_ROWS = 50_000
+
+SERIALIZATION_ROWS = 10_000
+
+AUTH_USERS = 20_000
+
+RANK_INDEX_USERS = 1_000_000
+
+# How often the event loop probe wakes up while a rebuild runs
+LOOP_PROBE_SECONDS = 0.001
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", nargs="+", default=["small"], choices=sorted(SCALES),
+                        help="several scales run one after another, each in its own process")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--sample-users", type=int, default=50,
+                        help="seeded users the requests are spread over")
+    parser.add_argument("--only", nargs="+", default=None,
+                        help="endpoint name prefixes to run, e.g. tasks dashboard.bundle")
+    parser.add_argument("--data-dir", default="bench_data")
+    parser.add_argument("--reseed", action="store_true", help="rebuild the cached seed database")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--serialization", action="store_true",
+                        help="measure response serialization CPU instead of endpoints")
+    parser.add_argument("--rows", type=int, default=SERIALIZATION_ROWS,
+                        help="rows per serialized response")
+    parser.add_argument("--repeat", type=int, default=5, help="serializations per path")
+    parser.add_argument("--auth", action="store_true",
+                        help="measure per-request authentication overhead instead of endpoints")
+    parser.add_argument("--rank-index", action="store_true",
+                        help="measure leaderboard rank index rebuilds and lookups instead of endpoints")
+    parser.add_argument("--users", type=int, default=None,
+                        help=f"seeded users for --auth (default {AUTH_USERS}) "
+                             f"and --rank-index (default {RANK_INDEX_USERS})")
+    return parser.parse_args(argv)
+
+
+# -------------------------------
+# Seeding
+# -------------------------------
+def _seed_path(data_dir: str, scale: str) -> str:
+    users, skills, tasks = SCALES[scale]
+    return os.path.join(data_dir, f"seed-{scale}-{users}u-{skills}s-{tasks}t.db")
+
+
+def _chunks(rows, size: int = SEED_CHUNK_ROWS):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def seed_database(path: str, users: int, skills_per_user: int, tasks_per_skill: int) -> None:
+    """Build the seed database at ``path`` with bulk inserts, deterministically"""
+    from sqlalchemy import create_engine, event, insert
+    from sqlalchemy.orm import Session
+
+    from gamification import get_levels_from_xp
+    from migrations import run_migrations
+    from models import SKILL_CATEGORIES, Skill, Task, User
+    from password_service import hash_password
+    from skill_stats import recompute_task_counters
+    from trends import backfill_daily_rollups
+
+    partial = path + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    seed_engine = create_engine(f"sqlite:///{partial}")
+
+    @event.listens_for(seed_engine, "connect")
+    def _fast_load(dbapi_connection, connection_record):
+        # Nothing to protect while loading; a failed seed is simply rebuilt
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=OFF")
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.close()
+
+    run_migrations(seed_engine)
+
+    rng = random.Random(SEED)
+    now = datetime.now(timezone.utc)
+    today = now.date()
+    hashed_password = hash_password(BENCH_PASSWORD)
+
+    xp_values = [int(rng.paretovariate(1.5) * 100) for _ in range(users)]
+    levels = get_levels_from_xp(xp_values)
+
+    def user_rows():
+        for i in range(users):
+            streak = rng.randint(0, 30)
+            yield {
+                "id": i + 1,
+                "name": f"bench-{i + 1}",
+                "email": f"bench-{i + 1}@example.com",
+                "hashed_password": hashed_password,
+                "xp_points": xp_values[i],
+                "level": levels[i],
+                "current_streak": streak,
+                "longest_streak": streak + rng.randint(0, 30),
+                "last_activity_date": today - timedelta(days=rng.randint(0, 3)),
+                "data_version": 0,
+                "created_at": now - timedelta(days=365)
+            }
+
+    def skill_rows():
+        for i in range(users * skills_per_user):
+            yield {
+                "id": i + 1,
+                "user_id": i // skills_per_user + 1,
+                "name": f"skill-{i % skills_per_user}",
+                "description": "Seeded by benchmark.py",
+                "category": SKILL_CATEGORIES[i % len(SKILL_CATEGORIES)],
+                "priority": rng.randint(1, 3),
+                "target_hours": rng.choice([0, 10, 50, 100]),
+                "total_hours_spent": 0,
+                "goal_date": now + timedelta(days=rng.randint(-30, 180)) if rng.random() < 0.5 else None,
+                "created_at": now - timedelta(days=rng.randint(30, 365), seconds=i)
+            }
+
+    def task_rows():
+        for i in range(users * skills_per_user * tasks_per_skill):
+            skill_id = i // tasks_per_skill + 1
+            created_at = now - timedelta(days=rng.randint(0, 180), seconds=rng.randint(0, 86399))
+            completed = rng.random() < 0.4
+            yield {
+                "id": i + 1,
+                "title": f"task-{i % tasks_per_skill}",
+                "description": None,
+                "is_completed": completed,
+                "user_id": (skill_id - 1) // skills_per_user + 1,
+                "skill_id": skill_id,
+                "xp_reward": rng.choice([5, 10, 20]),
+                "estimated_minutes": rng.choice([15, 30, 60]),
+                "created_at": created_at,
+                "completed_at": min(now, created_at + timedelta(days=rng.randint(0, 14))) if completed else None
+            }
+
+    with seed_engine.begin() as conn:
+        for model, rows in ((User, user_rows()), (Skill, skill_rows()), (Task, task_rows())):
+            for chunk in _chunks(rows):
+                conn.execute(insert(model.__table__), chunk)
+
+    with Session(bind=seed_engine) as db:
+        recompute_task_counters(db)
+        backfill_daily_rollups(db, completions=True)
+
+    with seed_engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    seed_engine.dispose()
+    os.replace(partial, path)
+
+
+def _users_seed_path(data_dir: str, users: int) -> str:
+    return os.path.abspath(os.path.join(data_dir, f"seed-users-{users}u.db"))
+
+
+def seed_users_only(path: str, users: int) -> None:
+    """Build (once) a database at ``path`` holding ``users`` seeded users and nothing else"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        print(f"Seeding {users} users into {path}", file=sys.stderr)
+        seed_database(path, users, 0, 0)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+# -------------------------------
+# Endpoints
+# -------------------------------
+@dataclass
+class Subject:
+    """A seeded user the requests act as"""
+    user_id: int
+    email: str
+    headers: dict
+    skill_id: int
+    open_task_ids: list
+    spare_skill_ids: list
+
+
+@dataclass
+class Endpoint:
+    name: str
+    method: str
+    path: str
+    # (subject, request index) -> (url, json body or None)
+    build: Callable
+    # Authenticated endpoints send the subject's bearer token
+    auth: bool = True
+
+
+def _get(name: str, url: str) -> Endpoint:
+    return Endpoint(name, "GET", url, lambda s, i: (url, None))
+
+
+ENDPOINTS = [
+    Endpoint("root", "GET", "/", lambda s, i: ("/", None), auth=False),
+    Endpoint("metrics", "GET", "/metrics", lambda s, i: ("/metrics", None), auth=False),
+
+    Endpoint("auth.register", "POST", "/auth/register", lambda s, i: (
+        "/auth/register",
+        {"name": "bench", "email": f"register-{time.time_ns()}-{i}@example.com", "password": BENCH_PASSWORD}
+    ), auth=False),
+    Endpoint("auth.login", "POST", "/auth/login", lambda s, i: (
+        "/auth/login", {"email": s.email, "password": BENCH_PASSWORD}
+    ), auth=False),
+
+    _get("skills.list", "/skills/"),
+    Endpoint("skills.create", "POST", "/skills/", lambda s, i: (
+        "/skills/", {"name": f"bench-new-{i}", "category": "other"}
+    )),
+    Endpoint("skills.update", "PUT", "/skills/{skill_id}", lambda s, i: (
+        f"/skills/{s.skill_id}", {"name": f"skill-renamed-{i}", "priority": 2}
+    )),
+    Endpoint("skills.delete", "DELETE", "/skills/{skill_id}", lambda s, i: (
+        f"/skills/{s.spare_skill_ids.pop()}", None
+    )),
+
+    Endpoint("tasks.list", "GET", "/tasks/{skill_id}", lambda s, i: (f"/tasks/{s.skill_id}", None)),
+    Endpoint("tasks.create", "POST", "/tasks/{skill_id}", lambda s, i: (
+        f"/tasks/{s.skill_id}", {"title": f"bench-task-{i}"}
+    )),
+    Endpoint("tasks.bulk", "POST", "/tasks/{skill_id}/bulk", lambda s, i: (
+        f"/tasks/{s.skill_id}/bulk", {"tasks": [{"title": f"bench-bulk-{i}-{j}"} for j in range(20)]}
+    )),
+    Endpoint("tasks.complete", "PUT", "/tasks/{task_id}/complete", lambda s, i: (
+        f"/tasks/{s.open_task_ids.pop()}/complete", None
+    )),
+    Endpoint("tasks.complete_batch", "POST", "/tasks/complete-batch", lambda s, i: (
+        "/tasks/complete-batch", {"task_ids": [s.open_task_ids.pop() for _ in range(10)]}
+    )),
+
+    _get("dashboard.bundle", "/dashboard/bundle"),
+    _get("dashboard.overview", "/dashboard/overview"),
+    _get("dashboard.user_stats", "/dashboard/user-stats"),
+    _get("dashboard.activity_heatmap", "/dashboard/activity-heatmap"),
+    _get("dashboard.activity_heatmap_columnar", "/dashboard/activity-heatmap?format=columnar"),
+    _get("dashboard.leaderboard", "/dashboard/leaderboard"),
+    _get("dashboard.leaderboard_me", "/dashboard/leaderboard/me"),
+    _get("dashboard.leaderboard_around", "/dashboard/leaderboard/around"),
+    _get("dashboard.weak_areas", "/dashboard/weak-areas"),
+    _get("dashboard.skills_progress", "/dashboard/skills-progress"),
+    _get("dashboard.recent_tasks", "/dashboard/recent-tasks"),
+    _get("dashboard.skills_summary", "/dashboard/skills-summary"),
+    _get("dashboard.weekly_progress", "/dashboard/weekly-progress"),
+    _get("dashboard.monthly_progress", "/dashboard/monthly-progress"),
+    _get("dashboard.task_trend", "/dashboard/task-trend"),
+    _get("dashboard.skills_chart", "/dashboard/skills-chart"),
+    _get("dashboard.recommendations", "/dashboard/recommendations"),
+    _get("dashboard.priority_recommendations", "/dashboard/priority-recommendations"),
+    _get("dashboard.deadline_alerts", "/dashboard/deadline-alerts"),
+    _get("dashboard.learning_plan", "/dashboard/learning-plan"),
+    _get("dashboard.productivity_score", "/dashboard/productivity-score"),
+    _get("dashboard.calendar", "/dashboard/calendar"),
+    _get("dashboard.badges", "/dashboard/badges"),
+    _get("dashboard.ai_cache_stats", "/dashboard/ai-cache-stats"),
+]
+
+# Routes that call OpenAI (or its stub) and so are not benchmarked here
+SKIPPED_PATHS = {
+    "/dashboard/ai-recommendation", "/dashboard/ai-jobs", "/dashboard/ai-jobs/{job_id}",
+    "/dashboard/ai-learning-plan",
+}
+
+
+def _uncovered_routes(app) -> list:
+    covered = {(e.method, e.path.split("?")[0]) for e in ENDPOINTS} | {("GET", p) for p in SKIPPED_PATHS} \
+        | {("POST", p) for p in SKIPPED_PATHS}
+    docs = {app.openapi_url, app.docs_url, app.redoc_url, app.swagger_ui_oauth2_redirect_url}
+    return sorted(
+        f"{method} {route.path}"
+        for route in app.routes if route.path not in docs
+        for method in getattr(route, "methods", ()) - {"HEAD"}
+        if (method, route.path) not in covered
+    )
+
+
+def _load_subjects(sample_users: int, requests: int) -> list:
+    """Pick seeded users and set aside the open tasks and spare skills writes consume"""
+    from jose import jwt
+    from sqlalchemy import insert, select
+
+    from auth_utils import ALGORITHM, SECRET_KEY
+    from database import SessionLocal
+    from models import Skill, Task, User
+
+    with SessionLocal() as db:
+        users = db.execute(
+            select(User.id, User.email).order_by(User.id).limit(sample_users)
+        ).all()
+        # Each subject serves about requests / len(users) requests of an endpoint,
+        # plus a warm-up; complete and complete-batch draw 1 and 10 open tasks each
+        per_subject = requests // max(len(users), 1) + 2
+
+        subjects = []
+        for user_id, email in users:
+            skill_id = db.scalar(select(Skill.id).where(Skill.user_id == user_id).order_by(Skill.id))
+            open_task_ids = list(db.scalars(
+                select(Task.id).where(Task.user_id == user_id, Task.is_completed == False)
+                .limit(per_subject * 11)
+            ))
+            spare_skill_ids = list(db.scalars(insert(Skill).returning(Skill.id), [
+                {"user_id": user_id, "name": f"spare-{n}", "created_at": datetime.now(timezone.utc)}
+                for n in range(per_subject)
+            ]))
+            subjects.append(Subject(
+                user_id=user_id,
+                email=email,
+                headers={"Authorization": "Bearer " + jwt.encode(
+                    {"sub": email, "uid": user_id}, SECRET_KEY, algorithm=ALGORITHM
+                )},
+                skill_id=skill_id,
+                open_task_ids=open_task_ids,
+                spare_skill_ids=spare_skill_ids
+            ))
+        db.commit()
+    return subjects
+
+
+# -------------------------------
+# Running
+# -------------------------------
+async def bench_endpoint(client, endpoint: Endpoint, subjects: list, requests: int,
+                         concurrency: int) -> dict:
+    from loadtest import summarize
+    from query_stats import record_requests
+
+    latencies, errors, statuses = [], [], {}
+    next_index = iter(range(requests))
+
+    async def worker():
+        for i in next_index:
+            subject = subjects[i % len(subjects)]
+            try:
+                url, body = endpoint.build(subject, i)
+            except IndexError:
+                # Ran out of seeded open tasks or spare skills for this subject
+                errors.append(i)
+                continue
+            started = time.perf_counter()
+            response = await client.request(
+                endpoint.method, url, json=body, headers=subject.headers if endpoint.auth else None
+            )
+            elapsed = time.perf_counter() - started
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code < 400:
+                latencies.append(elapsed)
+            else:
+                errors.append(i)
+
+    with record_requests() as served:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    served = served or [None]
+
+    return {
+        "method": endpoint.method,
+        "path": endpoint.path,
+        **summarize(latencies, elapsed),
+        "errors": len(errors),
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        "queries_per_request": round(sum(s.queries for s in served if s) / len(served), 2),
+        "db_ms_per_request": round(sum(s.db_time for s in served if s) * 1000 / len(served), 2),
+    }
+
+
+async def run_benchmarks(args, endpoints: list) -> dict:
+    import httpx
+
+    from main import app
+
+    subjects = _load_subjects(args.sample_users, args.requests)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for endpoint in endpoints:
+                # One untimed request warms caches and lazily built state
+                random.shuffle(subjects)
+                await bench_endpoint(client, endpoint, subjects, 1, 1)
+                results[endpoint.name] = await bench_endpoint(
+                    client, endpoint, subjects, args.requests, args.concurrency
+                )
+                print(f"{endpoint.name}: {results[endpoint.name]['p50_ms']} ms p50", file=sys.stderr)
+
+    return {"endpoints": results, "uncovered_routes": _uncovered_routes(app)}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scale(args) -> dict:
+    """Seed (or reuse) the database for one scale and benchmark against a fresh copy"""
+    scale = args.scale[0]
+    users, skills, tasks = SCALES[scale]
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    seed_path = _seed_path(args.data_dir, scale)
+    if args.reseed or not os.path.exists(seed_path):
+        started = time.perf_counter()
+        print(f"Seeding {scale} ({users * skills * tasks} tasks) into {seed_path}", file=sys.stderr)
+        seed_database(seed_path, users, skills, tasks)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    run_path = os.path.join(args.data_dir, "run.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(run_path + suffix):
+            os.remove(run_path + suffix)
+    shutil.copyfile(seed_path, run_path)
+
+    endpoints = [
+        e for e in ENDPOINTS
+        if not args.only or any(e.name.startswith(prefix) for prefix in args.only)
+    ]
+    report = asyncio.run(run_benchmarks(args, endpoints))
+
+    return {
+        "scale": {"name": scale, "users": users, "skills_per_user": skills, "tasks_per_skill": tasks},
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "date": date.today().isoformat(),
+        **report,
+    }
+
+
+# -------------------------------
+# Serialization
+# -------------------------------
+def _serialization_cases(rows: int) -> dict:
+    """{case: {path: () -> body bytes}}, the slowest (pre-fast_json) path first"""
+    from typing import List
+
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+
+    from fast_json import FastJSONResponse, fast_response, trusted_response
+    from gamification import heatmap_columns_to_rows
+    from models import Skill, Task
+    from schemas import SkillResponse, TaskResponse
+
+    rng = random.Random(SEED)
+    # Naive, like datetimes read back from SQLite
+    start = datetime(2024, 1, 1)
+
+    skills = [
+        Skill(
+            id=i + 1, user_id=1, name=f"Skill {i}", description="Seeded skill for benchmarking",
+            category=rng.choice(["programming", "language", "music", "other"]),
+            priority=rng.randint(1, 3), target_hours=float(rng.randint(10, 200)),
+            total_hours_spent=round(rng.uniform(0, 100), 1),
+            goal_date=start + timedelta(days=rng.randint(30, 720)) if rng.random() < 0.5 else None,
+            created_at=start + timedelta(seconds=i, microseconds=rng.randint(0, 999_999)),
+        )
+        for i in range(rows)
+    ]
+    tasks = []
+    for i in range(rows):
+        created = start + timedelta(seconds=i, microseconds=rng.randint(0, 999_999))
+        done = rng.random() < 0.5
+        tasks.append(Task(
+            id=i + 1, user_id=1, skill_id=1, title=f"Task {i}", description=None, is_completed=done,
+            xp_reward=rng.choice([5, 10, 20]), estimated_minutes=rng.choice([15, 30, 60]),
+            created_at=created, completed_at=created + timedelta(hours=rng.randint(1, 72)) if done else None,
+        ))
+    completed = [rng.randint(0, 6) for _ in range(rows)]
+    heatmap = heatmap_columns_to_rows({
+        "start": date(2000, 1, 1).isoformat(),
+        "days": rows,
+        "tasks_completed": completed,
+        "minutes_spent": [n * 30 for n in completed],
+        "xp_earned": [n * 10 for n in completed],
+        "intensity": [n if n < 4 else 4 for n in completed],
+    })
+
+    loop = asyncio.new_event_loop()
+
+    def response_model(schema, objects, response_class):
+        # What FastAPI does for a route with response_model=List[schema]
+        field = create_response_field(name="Response", type_=List[schema], mode="serialization")
+        return lambda: response_class(loop.run_until_complete(
+            serialize_response(field=field, response_content=objects)
+        )).body
+
+    def encoder(content, response_class):
+        # What FastAPI does for a route without a response_model
+        return lambda: response_class(jsonable_encoder(content)).body
+
+    return {
+        "skills": {
+            "response_model_json": response_model(SkillResponse, skills, JSONResponse),
+            "response_model_orjson": response_model(SkillResponse, skills, FastJSONResponse),
+            "trusted_orjson": lambda: trusted_response(SkillResponse, skills).body,
+        },
+        "tasks": {
+            "response_model_json": response_model(TaskResponse, tasks, JSONResponse),
+            "response_model_orjson": response_model(TaskResponse, tasks, FastJSONResponse),
+            "trusted_orjson": lambda: trusted_response(TaskResponse, tasks).body,
+        },
+        "activity_heatmap": {
+            "encoder_json": encoder(heatmap, JSONResponse),
+            "encoder_orjson": encoder(heatmap, FastJSONResponse),
+            "orjson": lambda: fast_response(heatmap).body,
+        },
+    }
+
+
+def run_serialization(rows: int, repeat: int) -> dict:
+    """CPU milliseconds per response body for each case and path"""
+    results = {}
+    for case, paths in _serialization_cases(rows).items():
+        timings, bodies = {}, {}
+        for path, render in paths.items():
+            render()  # warm up lazily built validators and serializers
+            samples = []
+            for _ in range(repeat):
+                started = time.process_time()
+                bodies[path] = render()
+                samples.append(time.process_time() - started)
+            samples.sort()
+            timings[path] = {
+                "cpu_ms_min": round(samples[0] * 1000, 2),
+                "cpu_ms_median": round(samples[len(samples) // 2] * 1000, 2),
+            }
+
+        baseline, fastest = next(iter(paths)), list(paths)[-1]
+        results[case] = {
+            "paths": timings,
+            "bytes": len(bodies[fastest]),
+            "speedup": round(
+                timings[baseline]["cpu_ms_median"] / max(timings[fastest]["cpu_ms_median"], 0.01), 1
+            ),
+            # Every path has to produce the same document
+            "identical": all(json.loads(b) == json.loads(bodies[baseline]) for b in bodies.values()),
+        }
+
+    return {
+        "rows": rows,
+        "repeat": repeat,
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "date": date.today().isoformat(),
+        "cases": results,
+    }
+
+
+# -------------------------------
+# Authentication
+# -------------------------------
+def _microseconds(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "us_mean": round(sum(samples) / len(samples) * 1e6, 1),
+        "us_p50": round(samples[len(samples) // 2] * 1e6, 1),
+        "us_p95": round(samples[int(len(samples) * 0.95)] * 1e6, 1),
+    }
+
+
+async def _auth_timings(users: int, requests: int) -> dict:
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    from auth_dependencies import get_current_user
+    from auth_utils import create_access_token
+    from database import AsyncSessionLocal, async_engine
+    from principal_cache import principal_cache
+
+    rng = random.Random(SEED)
+    user_ids = [rng.randint(1, users) for _ in range(requests)]
+
+    # case: (claims for a user id, whether the principal cache is warm)
+    cases = {
+        # What get_current_user did before principal_cache and the uid claim
+        "decode_email_lookup": (lambda i: {"sub": f"bench-{i}@example.com"}, False),
+        "decode_pk_lookup": (lambda i: {"sub": f"bench-{i}@example.com", "uid": i}, False),
+        "cache_hit_pk_lookup": (lambda i: {"sub": f"bench-{i}@example.com", "uid": i}, True),
+    }
+
+    results = {}
+    try:
+        for case, (claims, warm) in cases.items():
+            credentials = [
+                HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_access_token(claims(i)))
+                for i in user_ids
+            ]
+            principal_cache.clear()
+            if warm:
+                for c in credentials:
+                    async with AsyncSessionLocal() as db:
+                        await get_current_user(c, db)
+
+            samples = []
+            for c in credentials:
+                if not warm:
+                    principal_cache.clear()
+                async with AsyncSessionLocal() as db:
+                    started = time.perf_counter()
+                    await get_current_user(c, db)
+                    samples.append(time.perf_counter() - started)
+            results[case] = _microseconds(samples)
+    finally:
+        await async_engine.dispose()
+
+    return results
+
+
+def run_auth(args) -> dict:
+    """Time get_current_user per request, before and after the principal cache"""
+    users = args.users or AUTH_USERS
+    cases = asyncio.run(_auth_timings(users, args.requests))
+    before, after = cases["decode_email_lookup"]["us_mean"], cases["cache_hit_pk_lookup"]["us_mean"]
+    return {
+        "users": users,
+        "requests": args.requests,
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "date": date.today().isoformat(),
+        "cases": cases,
+        "speedup": round(before / max(after, 0.1), 2),
+    }
+
+
+# -------------------------------
+# Rank index
+# -------------------------------
+async def _loop_stalls(stop: asyncio.Event) -> list:
+    """How late each LOOP_PROBE_SECONDS sleep woke up, until ``stop`` is set"""
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LOOP_PROBE_SECONDS)
+        lags.append(time.perf_counter() - started - LOOP_PROBE_SECONDS)
+    return lags
+
+
+async def _timed_rebuild(rebuild, inline: bool) -> dict:
+    """Run ``rebuild`` inline on the event loop or in a thread, probing the loop meanwhile"""
+    stop = asyncio.Event()
+    probe = asyncio.ensure_future(_loop_stalls(stop))
+    await asyncio.sleep(LOOP_PROBE_SECONDS * 10)
+
+    started, cpu_started = time.perf_counter(), time.process_time()
+    if inline:
+        rebuild()
+    else:
+        await asyncio.to_thread(rebuild)
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+
+    stop.set()
+    lags = sorted(await probe)
+    return {
+        "seconds": round(elapsed, 3),
+        "cpu_seconds": round(cpu, 3),
+        "max_loop_stall_ms": round(lags[-1] * 1000, 1),
+        "p99_loop_stall_ms": round(lags[int(len(lags) * 0.99)] * 1000, 1),
+    }
+
+
+def run_rank_index(args) -> dict:
+    """Rebuild and query the rank index over every seeded user"""
+    from database import SessionLocal, engine
+    from models import User
+    from rank_index import RankIndex, _ordered_users
+
+    users = args.users or RANK_INDEX_USERS
+
+    def inline_reload():
+        # What the leaderboard endpoints did on an expired TTL: read, sort in Python
+        with SessionLocal() as db:
+            RankIndex().load(db.query(User.id, User.xp_points).yield_per(10000))
+
+    index = RankIndex()
+
+    def background_reload():
+        with SessionLocal() as db:
+            index.reload(lambda: _ordered_users(db))
+
+    async def rebuilds():
+        return {
+            "inline_on_event_loop": await _timed_rebuild(inline_reload, inline=True),
+            "background_thread": await _timed_rebuild(background_reload, inline=False),
+        }
+
+    report = asyncio.run(rebuilds())
+    engine.dispose()
+
+    rng = random.Random(SEED)
+    user_ids = [rng.randint(1, users) for _ in range(args.requests)]
+    lookups = {
+        "rank": lambda i: index.rank(i),
+        "top_10": lambda i: index.top(10),
+        "around_5": lambda i: index.around(index.rank(i), 5),
+    }
+    timings = {}
+    for name, lookup in lookups.items():
+        samples = []
+        for user_id in user_ids:
+            started = time.perf_counter()
+            lookup(user_id)
+            samples.append(time.perf_counter() - started)
+        timings[name] = _microseconds(samples)
+
+    return {
+        "users": users,
+        "indexed": len(index),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "date": date.today().isoformat(),
+        "rebuilds": report,
+        "lookups": timings,
+    }
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    """Ratio of p95 latency and difference in queries per request, per endpoint"""
+    changes = {}
+    for name, result in report["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        changes[name] = {
+            "p95_ratio": round(result["p95_ms"] / before["p95_ms"], 2) if before["p95_ms"] else None,
+            "rps_ratio": round(result["rps"] / before["rps"], 2) if before["rps"] else None,
+            "queries_per_request_delta": round(
+                result["queries_per_request"] - before["queries_per_request"], 2
+            ),
+        }
+    return {"commit": baseline.get("commit"), "endpoints": changes}
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    argv = sys.argv[1:] if argv is None else argv
+
+    if args.serialization:
+        print(json.dumps(run_serialization(args.rows, args.repeat), indent=2))
+        return
+
+    if args.auth or args.rank_index:
+        # Read-only, so the cached seed database is used in place
+        users = args.users or (AUTH_USERS if args.auth else RANK_INDEX_USERS)
+        seed_path = _users_seed_path(args.data_dir, users)
+        os.environ["DATABASE_URL"] = f"sqlite:///{seed_path}"
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+        seed_users_only(seed_path, users)
+        print(json.dumps(run_auth(args) if args.auth else run_rank_index(args), indent=2))
+        return
+
+    if len(args.scale) > 1:
+        # The engine is bound to DATABASE_URL at import, so each scale gets a process
+        reports = []
+        for scale in args.scale:
+            child_argv = [a for a in argv if a not in args.scale and a != "--scale"] + ["--scale", scale]
+            reports.append(json.loads(subprocess.run(
+                [sys.executable, os.path.abspath(__file__), *child_argv],
+                check=True, stdout=subprocess.PIPE, text=True
+            ).stdout))
+        print(json.dumps(reports, indent=2))
+        return
+
+    run_path = os.path.abspath(os.path.join(args.data_dir, "run.db"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{run_path}"
+    # ai_service builds its clients at import; the AI routes are never called
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    report = run_scale(args)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        # Reports of several scales are lists; compare like with like
+        baselines = baseline if isinstance(baseline, list) else [baseline]
+        baseline = next((b for b in baselines if b["scale"]["name"] == args.scale[0]), {})
+        report["baseline"] = compare(report, baseline)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,27 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from database import get_db
+from database import get_async_db
 from models import Skill, Task, User
+from schemas import SkillResponse
 from auth_dependencies import get_current_user
 
-from datetime import datetime, timedelta
-from sqlalchemy import func
-
-from ai_service import generate_learning_plan
-from gamification import get_user_stats, get_activity_heatmap
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import func, select
+
+from ai_service import get_learning_plan_async, start_plan_job, wait_for_job
+from plan_cache import get_cache_stats
+from rank_index import rank_index
+from data_version import check_etag
+from pagination import PageParams, paginate, finish_page
+from fast_json import fast_response, trusted_rows
+from gamification import (
+    activity_day, get_user_stats, get_activity_heatmap_columns, heatmap_columns_to_rows, MAX_HEATMAP_DAYS
+)
+from skill_stats import get_skill_task_counts, get_progress_percent
+from trends import get_trend, TREND_GRANULARITIES
 from time import time
 
 
@@ -21,25 +33,11 @@ router = APIRouter(
 )
 
 # -------------------------------
-# GET /dashboard/overview
+# Section builders shared by single endpoints and /bundle
 # -------------------------------
-@router.get("/overview")
-def dashboard_overview(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    total_skills = db.query(Skill).filter(
-        Skill.user_id == current_user.id
-    ).count()
-
-    total_tasks = db.query(Task).filter(
-        Task.user_id == current_user.id
-    ).count()
-
-    completed_tasks = db.query(Task).filter(
-        Task.user_id == current_user.id,
-        Task.is_completed == True
-    ).count()
+def build_overview(current_user: User, total_skills: int) -> dict:
+    total_tasks = current_user.task_count or 0
+    completed_tasks = current_user.completed_count or 0
 
     pending_tasks = total_tasks - completed_tasks
 
@@ -56,168 +54,358 @@ def dashboard_overview(
     }
 
 
+def build_weak_areas(skill_counts: list) -> list:
+    weak_skills = []
+    for stats in skill_counts:
+        skill = stats["skill"]
+        if stats["total"] > 0:
+            progress = get_progress_percent(stats)
+            if progress < 50:  # Less than 50% completion = weak area
+                weak_skills.append({
+                    "skill_id": skill.id,
+                    "skill_name": skill.name,
+                    "category": skill.category,
+                    "progress_percent": round(progress, 1),
+                    "pending_tasks": stats["pending"],
+                    "recommendation": f"Focus on completing {stats['pending']} remaining tasks in {skill.name}"
+                })
+    
+    # Sort by lowest progress first
+    weak_skills.sort(key=lambda x: x["progress_percent"])
+    
+    return weak_skills
+
+
+NO_SKILLS_RECOMMENDATION = "Add some skills to get AI-powered learning recommendations!"
+
+
+def build_skills_prompt(skill_counts: list) -> str:
+    # Summarize user's skills and progress
+    skills_data = []
+    for stats in skill_counts:
+        progress = get_progress_percent(stats)
+        skills_data.append(
+            f"- {stats['skill'].name}: {stats['completed']}/{stats['total']} tasks ({progress:.0f}%)"
+        )
+    
+    return "\n".join(skills_data)
+
+
+async def build_ai_recommendation(db: AsyncSession, current_user: User, skill_counts: list) -> dict:
+    skills_summary = build_skills_prompt(skill_counts)
+    if not skills_summary:
+        return {"recommendation": NO_SKILLS_RECOMMENDATION}
+    
+    recommendation = await get_learning_plan_async(db, current_user.id, skills_summary)
+    
+    return {"recommendation": recommendation}
+
+
+# -------------------------------
+# GET /dashboard/overview
+# -------------------------------
+@router.get("/overview", dependencies=[Depends(check_etag)])
+async def dashboard_overview(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    total_skills = await db.scalar(select(func.count(Skill.id)).where(
+        Skill.user_id == current_user.id
+    ))
+
+    return build_overview(current_user, total_skills)
+
+
+HEATMAP_FORMATS = ("list", "columnar")
+
+
+def build_activity_heatmap(db: Session, current_user: User, days: int = 365,
+                           start: Optional[date] = None, end: Optional[date] = None,
+                           format: str = "list"):
+    """``list`` is one dict per day; ``columnar`` is a start date plus parallel arrays"""
+    if format not in HEATMAP_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(HEATMAP_FORMATS)}")
+
+    end = end or activity_day()
+    start = start or end - timedelta(days=days)
+    _check_range(start, end)
+
+    columns = get_activity_heatmap_columns(db, current_user, start, end)
+    return columns if format == "columnar" else heatmap_columns_to_rows(columns)
+
+
+def _check_range(start: date, end: date) -> None:
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days + 1 > MAX_HEATMAP_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_HEATMAP_DAYS} days")
+
+
+def build_trend(db: Session, current_user: User, metric: str, key: str, days: int,
+                start: Optional[date] = None, end: Optional[date] = None,
+                granularity: str = "day") -> list:
+    """``[{"date": bucket start, key: total}, ...]`` for the last ``days`` days
+    or an explicit ``start``..``end`` range"""
+    if granularity not in TREND_GRANULARITIES:
+        raise HTTPException(
+            status_code=400, detail=f"granularity must be one of: {', '.join(TREND_GRANULARITIES)}"
+        )
+
+    end = end or activity_day()
+    start = start or end - timedelta(days=days - 1)
+    _check_range(start, end)
+
+    return [
+        {"date": bucket.isoformat(), key: total}
+        for bucket, total in get_trend(db, current_user, metric, start, end, granularity)
+    ]
+
+
+# -------------------------------
+# GET /dashboard/bundle (initial dashboard load)
+# -------------------------------
+BUNDLE_SECTIONS = [
+    "overview", "user-stats", "skills", "activity-heatmap", "weak-areas", "ai-recommendation"
+]
+
+# The AI plan is slow, so clients ask for it explicitly (or fetch it afterwards)
+DEFAULT_BUNDLE_SECTIONS = [s for s in BUNDLE_SECTIONS if s != "ai-recommendation"]
+
+
+@router.get("/bundle")
+async def dashboard_bundle(
+    sections: str = ",".join(DEFAULT_BUNDLE_SECTIONS),
+    heatmap_days: int = 365,
+    heatmap_format: str = "list",
+    request: Request = None,
+    response: Response = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    requested = [s.strip() for s in sections.split(",") if s.strip()]
+    unknown = [s for s in requested if s not in BUNDLE_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(unknown)}")
+
+    # The AI plan can change without a data write, so only plain bundles are tagged
+    if "ai-recommendation" not in requested:
+        await check_etag(request, response, current_user)
+
+    # Skills, overview, weak areas and the AI prompt all share one skills query
+    skill_counts = await db.run_sync(get_skill_task_counts, current_user)
+
+    # Builders take the sync session behind db and run together in one run_sync
+    builders = {
+        "overview": lambda sync_db: build_overview(current_user, len(skill_counts)),
+        "user-stats": lambda sync_db: get_user_stats(sync_db, current_user),
+        "skills": lambda sync_db: trusted_rows(SkillResponse, [s["skill"] for s in skill_counts]),
+        "activity-heatmap": lambda sync_db: build_activity_heatmap(
+            sync_db, current_user, heatmap_days, format=heatmap_format
+        ),
+        "weak-areas": lambda sync_db: build_weak_areas(skill_counts),
+    }
+
+    built = await db.run_sync(
+        lambda sync_db: {s: builders[s](sync_db) for s in requested if s in builders}
+    )
+    if "ai-recommendation" in requested:
+        built["ai-recommendation"] = await build_ai_recommendation(db, current_user, skill_counts)
+
+    return fast_response({section: built[section] for section in requested}, response)
+
+
 # -------------------------------
 # GET /dashboard/ai-recommendation
 # -------------------------------
 @router.get("/ai-recommendation")
-def ai_recommendation(
-    db: Session = Depends(get_db),
+async def ai_recommendation(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    # Get user's skills and progress
-    skills = db.query(Skill).filter(
-        Skill.user_id == current_user.id
-    ).all()
-    
-    skills_data = []
-    for skill in skills:
-        total = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id
-        ).count()
-        
-        completed = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id,
-            Task.is_completed == True
-        ).count()
-        
-        progress = (completed / total * 100) if total > 0 else 0
-        skills_data.append(f"- {skill.name}: {completed}/{total} tasks ({progress:.0f}%)")
-    
-    if not skills_data:
-        return {"recommendation": "Add some skills to get AI-powered learning recommendations!"}
-    
-    skills_summary = "\n".join(skills_data)
-    recommendation = generate_learning_plan(skills_summary)
-    
+    skill_counts = await db.run_sync(get_skill_task_counts, current_user)
+    skills_summary = build_skills_prompt(skill_counts)
+    if not skills_summary:
+        return {"recommendation": NO_SKILLS_RECOMMENDATION}
+
+    # Awaiting the async client keeps request threads free while OpenAI responds
+    recommendation = await get_learning_plan_async(db, current_user.id, skills_summary)
+
     return {"recommendation": recommendation}
 
 
+# -------------------------------
+# POST /dashboard/ai-jobs, GET /dashboard/ai-jobs/{job_id}
+# -------------------------------
+@router.post("/ai-jobs")
+async def create_ai_job(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    skill_counts = await db.run_sync(get_skill_task_counts, current_user)
+    skills_summary = build_skills_prompt(skill_counts)
+    if not skills_summary:
+        return {"job_id": None, "status": "done", "result": NO_SKILLS_RECOMMENDATION}
+
+    return await start_plan_job(db, current_user.id, skills_summary)
+
+
+@router.get("/ai-jobs/{job_id}")
+async def get_ai_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Hand back the connection get_current_user read through before long-polling
+    await db.close()
+
+    job = await wait_for_job(job_id, current_user.id, wait)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
+
+# -------------------------------
+# GET /dashboard/ai-cache-stats
+# -------------------------------
+@router.get("/ai-cache-stats")
+async def ai_cache_stats(
+    current_user: User = Depends(get_current_user)
+):
+    return get_cache_stats()
+
+
 # -------------------------------
 # GET /dashboard/user-stats (Gamification)
 # -------------------------------
-@router.get("/user-stats")
-def user_stats(
-    db: Session = Depends(get_db),
+@router.get("/user-stats", dependencies=[Depends(check_etag)])
+async def user_stats(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    return get_user_stats(db, current_user)
+    return await db.run_sync(get_user_stats, current_user)
 
 
 # -------------------------------
 # GET /dashboard/activity-heatmap
 # -------------------------------
-@router.get("/activity-heatmap")
-def activity_heatmap(
+@router.get("/activity-heatmap", dependencies=[Depends(check_etag)])
+async def activity_heatmap(
     days: int = 365,
-    db: Session = Depends(get_db),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    format: str = "list",
+    response: Response = None,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    return get_activity_heatmap(db, current_user, days)
+    return fast_response(
+        await db.run_sync(build_activity_heatmap, current_user, days, start, end, format), response
+    )
 
 
 # -------------------------------
 # GET /dashboard/leaderboard (Top users)
 # -------------------------------
-@router.get("/leaderboard")
-def leaderboard(
-    limit: int = 10,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    top_users = db.query(User).order_by(User.xp_points.desc()).limit(limit).all()
-    
-    return [
-        {
-            "rank": idx + 1,
+def build_leaderboard_rows(db: Session, current_user: User, entries: list) -> list:
+    """Attach user details to (rank, user_id, xp) entries from the rank index"""
+    users = {
+        u.id: u for u in db.query(User).filter(User.id.in_([e[1] for e in entries])).all()
+    }
+
+    rows = []
+    for rank, user_id, xp in entries:
+        user = users.get(user_id)
+        if user is None:
+            rank_index.remove(user_id)
+            continue
+        if user.xp_points != xp:
+            # XP changed in another worker process; the next read is exact
+            rank_index.update(user_id, user.xp_points)
+        rows.append({
+            "rank": rank,
             "name": user.name,
             "level": user.level,
             "xp_points": user.xp_points,
             "current_streak": user.current_streak,
             "is_current_user": user.id == current_user.id
-        }
-        for idx, user in enumerate(top_users)
-    ]
+        })
+    return rows
+
+
+def get_rank(current_user: User) -> int:
+    # The user row was just read, so it beats a reload that raced our own write
+    if rank_index.xp(current_user.id) != current_user.xp_points:
+        rank_index.update(current_user.id, current_user.xp_points)
+    return rank_index.rank(current_user.id)
+
+
+@router.get("/leaderboard")
+async def leaderboard(
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    return await db.run_sync(build_leaderboard_rows, current_user, rank_index.top(limit))
 
 
 # -------------------------------
-# GET /dashboard/weak-areas (AI Analysis)
+# GET /dashboard/leaderboard/me
 # -------------------------------
-@router.get("/weak-areas")
-def weak_areas(
-    db: Session = Depends(get_db),
+@router.get("/leaderboard/me")
+async def leaderboard_me(
     current_user: User = Depends(get_current_user)
 ):
-    skills = db.query(Skill).filter(
-        Skill.user_id == current_user.id
-    ).all()
-    
-    weak_skills = []
-    for skill in skills:
-        total = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id
-        ).count()
-        
-        completed = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id,
-            Task.is_completed == True
-        ).count()
-        
-        if total > 0:
-            progress = (completed / total) * 100
-            if progress < 50:  # Less than 50% completion = weak area
-                weak_skills.append({
-                    "skill_id": skill.id,
-                    "skill_name": skill.name,
-                    "category": skill.category,
-                    "progress_percent": round(progress, 1),
-                    "pending_tasks": total - completed,
-                    "recommendation": f"Focus on completing {total - completed} remaining tasks in {skill.name}"
-                })
-    
-    # Sort by lowest progress first
-    weak_skills.sort(key=lambda x: x["progress_percent"])
-    
-    return weak_skills
+    return {
+        "rank": get_rank(current_user),
+        "xp_points": current_user.xp_points,
+        "total_users": len(rank_index)
+    }
 
 
 # -------------------------------
-# GET /dashboard/skills-progress
+# GET /dashboard/leaderboard/around (neighbourhood of a rank, default: mine)
 # -------------------------------
-@router.get("/skills-progress")
-def skills_progress(
-    db: Session = Depends(get_db),
+@router.get("/leaderboard/around")
+async def leaderboard_around(
+    rank: int = Query(None, ge=1),
+    radius: int = Query(5, ge=0, le=50),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    skills = db.query(Skill).filter(
-        Skill.user_id == current_user.id
-    ).all()
+    if rank is None:
+        rank = get_rank(current_user)
 
-    result = []
+    return await db.run_sync(build_leaderboard_rows, current_user, rank_index.around(rank, radius))
 
-    for skill in skills:
-        total_tasks = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id
-        ).count()
 
-        completed_tasks = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id,
-            Task.is_completed == True
-        ).count()
+# -------------------------------
+# GET /dashboard/weak-areas (AI Analysis)
+# -------------------------------
+@router.get("/weak-areas", dependencies=[Depends(check_etag)])
+async def weak_areas(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    return build_weak_areas(await db.run_sync(get_skill_task_counts, current_user))
+
 
-        progress = 0
-        if total_tasks > 0:
-            progress = (completed_tasks / total_tasks) * 100
+# -------------------------------
+# GET /dashboard/skills-progress
+# -------------------------------
+@router.get("/skills-progress", dependencies=[Depends(check_etag)])
+async def skills_progress(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    result = []
 
+    for stats in await db.run_sync(get_skill_task_counts, current_user):
         result.append({
-            "skill_id": skill.id,
-            "skill_name": skill.name,
-            "progress_percent": round(progress, 2)
+            "skill_id": stats["skill"].id,
+            "skill_name": stats["skill"].name,
+            "progress_percent": round(get_progress_percent(stats), 2)
         })
 
     return result
@@ -226,14 +414,14 @@ def skills_progress(
 # -------------------------------
 # GET /dashboard/recent-tasks
 # -------------------------------
-@router.get("/recent-tasks")
-def recent_tasks(
-    db: Session = Depends(get_db),
+@router.get("/recent-tasks", dependencies=[Depends(check_etag)])
+async def recent_tasks(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    tasks = db.query(Task).filter(
+    tasks = (await db.execute(select(Task).where(
         Task.user_id == current_user.id
-    ).order_by(Task.created_at.desc()).limit(5).all()
+    ).order_by(Task.created_at.desc()).limit(5))).scalars().all()
 
     return [
         {
@@ -249,31 +437,16 @@ def recent_tasks(
 # -------------------------------
 # GET /dashboard/skills-summary
 # -------------------------------
-@router.get("/skills-summary")
-def skills_summary(
-    db: Session = Depends(get_db),
+@router.get("/skills-summary", dependencies=[Depends(check_etag)])
+async def skills_summary(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    skills = db.query(Skill).filter(
-        Skill.user_id == current_user.id
-    ).all()
-
     completed = 0
     in_progress = 0
 
-    for skill in skills:
-        total = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id
-        ).count()
-
-        done = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id,
-            Task.is_completed == True
-        ).count()
-
-        if total > 0 and total == done:
+    for stats in await db.run_sync(get_skill_task_counts, current_user):
+        if stats["total"] > 0 and stats["pending"] == 0:
             completed += 1
         else:
             in_progress += 1
@@ -286,170 +459,91 @@ def skills_summary(
 
 # Weekly task anlytics
 
-@router.get("/weekly-progress")
-def weekly_progress(
-    db: Session = Depends(get_db),
+@router.get("/weekly-progress", dependencies=[Depends(check_etag)])
+async def weekly_progress(
+    days: int = Query(7, ge=1),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = "day",
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    today = datetime.utcnow().date()
-    start_date = today - timedelta(days=6)
-
-    data = (db.query(
-        func.date(Task.created_at).label('date'),
-        func.count(Task.id).label('count')
-    ).filter(
-        Task.user_id == current_user.id,
-        Task.created_at >= start_date
-    ).group_by(
-        func.date(Task.created_at)
-    ).all()
+    # Tasks created per bucket
+    return await db.run_sync(
+        build_trend, current_user, "tasks_created", "task_count", days, start, end, granularity
     )
-  
-    result=[]
-
-    for i in range(7):
-
-        date = start_date + timedelta(days=i)
-        for record in data:
-            if record.date == date:
-                count = record.count
-                break
-        result.append({"date": date.isoformat(), "task_count": count})
-
-    return result
 
 
 # Monthly completion analytics
 
 
-@router.get("/monthly-progress")
+@router.get("/monthly-progress", dependencies=[Depends(check_etag)])
 
-def monthly_progress(
-    db: Session = Depends(get_db),
+async def monthly_progress(
+    days: int = Query(30, ge=1),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = "day",
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    
-    today = datetime.utcnow().date()
-    start_date = today - timedelta(days=29) #last 30 days
-
-    data = (
-        db.query(
-        func.date(Task.created_at).label('date'),
-        func.count(Task.id).label('count')
-    ).filter(
-        Task.user_id == current_user.id,
-        Task.created_at >= start_date
-    ).group_by(
-        func.date(Task.created_at)).all()
-    ).all()
-    
-  
-    result=[]
-
-    for i in range(30):
-
-        day = start_date + timedelta(days=i)
-        count = next((d.count for d in data if d.date == day), 0)
-        result.append({"date": day.isoformat(), "tasks": count})
-    return result
+    # Tasks created per bucket, last 30 days by default
+    return await db.run_sync(
+        build_trend, current_user, "tasks_created", "tasks", days, start, end, granularity
+    )
 
 
 # Task Completion Trend(Last 7 days)
 
-@router.get("/task-trend")
-def task_trend(
-    db: Session = Depends(get_db),
+@router.get("/task-trend", dependencies=[Depends(check_etag)])
+async def task_trend(
+    days: int = Query(7, ge=1),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = "day",
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-
-    today = datetime.utcnow()
-    data = []
-
-    for i in range(6,-1,-1): 
-        day= today - timedelta(days=i)
-        start=day.replace(hour=0,minute=0,second=0,microsecond=0)
-        end=start + timedelta(days=1)
-
-
-        completed = db.query(Task).filter(
-            Task.user_id == current_user.id,
-            Task.is_completed == True,
-            Task.created_at >= start,
-            Task.created_at < end
-        ).count()
-
-        data.append({
-            "date": start.strftime("%Y-%m-%d"),
-            "completed_tasks": completed
-
-        })
-
-        return data
+    # Tasks completed per bucket
+    return await db.run_sync(
+        build_trend, current_user, "tasks_completed", "completed_tasks", days, start, end, granularity
+    )
     
     # Skill Progress Chart API
 
-@router.get("/skills-chart")
-def skills_chart(
-        db: Session = Depends(get_db),
+@router.get("/skills-chart", dependencies=[Depends(check_etag)])
+async def skills_chart(
+        db: AsyncSession = Depends(get_async_db),
         current_user: User = Depends(get_current_user)
     ):
-        skills = db.query(Skill).filter(
-            Skill.user_id == current_user.id
-        ).all()
-
         chart_data = []
 
-        for skill in skills:
-            total = db.query(Task).filter(
-                Task.skill_id == skill.id,
-                Task.user_id == current_user.id
-            ).count()
-
-            completed = db.query(Task).filter(
-                Task.skill_id == skill.id,
-                Task.user_id == current_user.id,
-                Task.is_completed == True
-            ).count()
-
-            percent=(completed/total*100) if total>0 else 0
-
+        for stats in await db.run_sync(get_skill_task_counts, current_user):
             chart_data.append({
-                "skill": skill.name,
-                "progress":round(percent,2)
+                "skill": stats["skill"].name,
+                "progress":round(get_progress_percent(stats),2)
             })
 
-            return chart_data
+        return chart_data
         
 # AI Skill Recommendations
 
-@router.get("/recommendations")
-def skill_recommendations(
-    db: Session = Depends(get_db),
+@router.get("/recommendations", dependencies=[Depends(check_etag)])
+async def skill_recommendations(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    skills = db.query(Skill).filter(Skill.user_id == current_user.id).all()
     recommendations = []
 
-    for skill in skills:
-        total = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id
-        ).count()
-
-        completed = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id,
-            Task.is_completed == True
-        ).count()
-
-        if total == 0:
+    for stats in await db.run_sync(get_skill_task_counts, current_user):
+        if stats["total"] == 0:
             recommendations.append({
-                "skill": skill.name,
+                "skill": stats["skill"].name,
                 "advice": "Add tasks to start progress"
             })
-        elif completed / total < 0.4:
+        elif stats["completed"] / stats["total"] < 0.4:
             recommendations.append({
-                "skill": skill.name,
+                "skill": stats["skill"].name,
                 "advice": "Low progress – focus more this week"
             })
 
@@ -458,38 +552,23 @@ def skill_recommendations(
     
 #Priority Recommendations
 
-@router.get("/priority-recommendations")
-def priority_recommendations(
-    db: Session = Depends(get_db),
+@router.get("/priority-recommendations", dependencies=[Depends(check_etag)])
+async def priority_recommendations(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    skills = db.query(Skill).filter(
-        Skill.user_id == current_user.id
-    ).all()
-
     result=[]
 
-    for skill in skills:
-        total = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id,
-        ).count()
-
-        completed = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id,
-            Task.is_completed == True
-        ).count()
-
-        pending = total - completed
-        progress=(completed/total) if total>0 else 0
+    for stats in await db.run_sync(get_skill_task_counts, current_user):
+        pending = stats["pending"]
+        progress=get_progress_percent(stats)/100
         priority_score = pending * (1 - progress)
 
         result.append({
-            "skill": skill.name,
+            "skill": stats["skill"].name,
             "pending_tasks": pending,
             "progress_percent": round(progress*100, 2),
-            "priority_score": (priority_score,2)
+            "priority_score": round(priority_score,2)
         })
 
     result.sort(key=lambda x: x["priority_score"], reverse=True)
@@ -498,37 +577,20 @@ def priority_recommendations(
 
 #Deadline-Aware AI Advice
 
-@router.get("/deadline-alerts")
-def deadline_alerts(
-    db: Session = Depends(get_db),
+@router.get("/deadline-alerts", dependencies=[Depends(check_etag)])
+async def deadline_alerts(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     
     today=datetime.utcnow()
     alerts=[]
 
-    skills = db.query(Skill).filter(
-        Skill.user_id == current_user.id,
-        Skill.goal_date!= None
-    ).all()
-
-
-    for skill in skills:
+    for stats in await db.run_sync(get_skill_task_counts, current_user, Skill.goal_date != None):
+        skill = stats["skill"]
         days_left = (skill.goal_date - today).days
 
-        total = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id,
-        ).count()
-
-        completed = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id,
-            Task.is_completed == True
-        ).count()
-
-
-        progress = (completed / total*100) if total > 0 else 0
+        progress = get_progress_percent(stats)
 
 
         if days_left <= 7 and progress < 50:
@@ -544,30 +606,15 @@ def deadline_alerts(
 
 #GPT-Powered Learning Plan
 
-@router.get("/learning-plan")
-def learning_plan(
-    db: Session = Depends(get_db),
+@router.get("/learning-plan", dependencies=[Depends(check_etag)])
+async def learning_plan(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    skills = db.query(Skill).filter(
-        Skill.user_id == current_user.id
-    ).all()
-
     plan=[]
 
-    for skill in skills:
-        total = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id,
-        ).count()
-
-        completed = db.query(Task).filter(
-            Task.skill_id == skill.id,
-            Task.user_id == current_user.id,
-            Task.is_completed == True
-        ).count()
-
-        progress=(completed/total*100) if total>0 else 0
+    for stats in await db.run_sync(get_skill_task_counts, current_user):
+        progress=get_progress_percent(stats)
 
         if progress <30:
             advice="Focus on fundamentals and daily practice"
@@ -576,55 +623,24 @@ def learning_plan(
         else:
             advice="Revise & apply knowledge in projects"
 
-            plan.append({
-                "skill": skill.name,
-                "progress": round(progress,2),
-                "learning_advice": advice
-            })
+        plan.append({
+            "skill": stats["skill"].name,
+            "progress": round(progress,2),
+            "learning_advice": advice
+        })
 
     return plan
 
-#AI-Learning Plan
-
-@router.get("/ai-learning-plan")
-
-def ai_learning_plan(
-
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    
-    skills=db.query(Skill).filter(Skill.user_id==current_user.id).all()
-
-    skill_data=[
-
-        {
-            "skill": s.name,
-            "progress": s.progress_percent}
-            for s in skills
-    ]
-
-
-    plan=generate_learning_plan(skill_data)
-
-    return{"plan":plan}
-
 #Productivity Score
 
 
-@router.get("/productivity-score")
-def productivity_score(
-    db: Session = Depends(get_db),
+@router.get("/productivity-score", dependencies=[Depends(check_etag)])
+async def productivity_score(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    total = db.query(Task).filter(
-        Task.user_id == current_user.id
-    ).count()
-
-    completed = db.query(Task).filter(
-        Task.user_id == current_user.id,
-        Task.is_completed == True
-    ).count()
+    total = current_user.task_count or 0
+    completed = current_user.completed_count or 0
 
     score=int((completed/total*100) if total>0 else 0)
 
@@ -643,38 +659,46 @@ def productivity_score(
 
 # Calendar Integration
 
-@router.get("/calendar")
-def calendar_tasks(
-    db: Session = Depends(get_db),
+@router.get("/calendar", dependencies=[Depends(check_etag)])
+async def calendar_tasks(
+    response: Response,
+    completed: Optional[bool] = None,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    tasks = db.query(Task).filter(
-        Task.user_id == current_user.id
-    ).all()
+    stmt = select(Task).where(Task.user_id == current_user.id)
+    if completed is not None:
+        stmt = stmt.where(Task.is_completed == completed)
 
-    return [
+    tasks = finish_page(
+        (await db.execute(paginate(stmt, Task, page))).scalars().all(), page, response
+    )
+
+    # Tasks have no deadline; a task sits on the day it was completed, else created
+    return fast_response([
         {
-            "title":t.title,
-            "date": t.deadline
+            "task_id": t.id,
+            "skill_id": t.skill_id,
+            "title": t.title,
+            "is_completed": t.is_completed,
+            "date": (t.completed_at or t.created_at).date().isoformat()
         }
 
-        for t in tasks if t.deadline
-    ]
+        for t in tasks
+    ], response)
 
 #Gamification Badges
 AI_RATE_LIMIT = {}  # user_id -> last_called_timestamp
 AI_COOLDOWN = 60    # seconds
 
 
-@router.get("/badges")
-def badges(
-    db: Session = Depends(get_db),
+@router.get("/badges", dependencies=[Depends(check_etag)])
+async def badges(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    completed = db.query(Task).filter(
-        Task.user_id == current_user.id,
-        Task.is_completed == True
-    ).count()
+    completed = current_user.completed_count or 0
 
     badges = []
 
@@ -688,10 +712,10 @@ def badges(
     return badges
 
 
-#Simple Rate Limit
+#AI-Learning Plan (with simple rate limit)
 @router.get("/ai-learning-plan")
-def ai_learning_plan(
-    db: Session = Depends(get_db),
+async def ai_learning_plan(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     now=time()
@@ -705,19 +729,17 @@ def ai_learning_plan(
         }
     
     AI_RATE_LIMIT[current_user.id]=now
-    skills = db.query(Skill).filter(
 
-        Skill.user_id==current_user.id
-    )
+    skill_counts = await db.run_sync(get_skill_task_counts, current_user)
 
     skill_data=[
 
         {
-            "skill":s.name,"progress":s.progress_percent}
-            for s in skills
+            "skill":stats["skill"].name,"progress":round(get_progress_percent(stats),2)}
+            for stats in skill_counts
         
     ]
 
-    plan=generate_learning_plan(skill_data)
+    plan=await get_learning_plan_async(db, current_user.id, skill_data)
 
     return {"plan":plan}
@@ -0,0 +1,60 @@
+"""
+Data Version Service - Per-user change counter behind dashboard ETags
+
+Every write that can change what a user's dashboard shows increments
+users.data_version inside the same transaction. Read endpoints derive their
+ETag from it and answer If-None-Match with 304 before running any queries.
+"""
+from datetime import datetime, timezone
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from auth_dependencies import get_current_user
+from models import User
+
+
+# Increment expression for writes that already UPDATE the users row
+NEXT_DATA_VERSION = User.data_version + 1
+
+
+def bump_data_version(db: Session, user_id: int) -> None:
+    """Mark a user's data as changed; does not commit"""
+    db.execute(
+        update(User).where(User.id == user_id).values(
+            data_version=NEXT_DATA_VERSION
+        ).execution_options(synchronize_session=False)
+    )
+
+
+def make_etag(user: User) -> str:
+    # The date is part of the tag because day-relative views (heatmap,
+    # trends, deadlines) change at midnight without a write. UTC, like the
+    # activity rollup's days (gamification.activity_day)
+    today = datetime.now(timezone.utc).date()
+    return f'W/"{user.id}-{user.data_version or 0}-{today.isoformat()}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/ prefixes are ignored
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+async def check_etag(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+) -> None:
+    """Route dependency: 304 when the client's copy is current, else tag the response"""
+    etag = make_etag(current_user)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _matches(if_none_match, etag):
+        raise HTTPException(status_code=304, headers=headers)
+
+    response.headers.update(headers)
@@ -1,9 +1,13 @@
 """
 Gamification Service - Handles XP, Levels, Streaks
 """
+from bisect import bisect_right
 from datetime import datetime, date, timedelta, timezone
+from sqlalchemy import update, case, bindparam
 from sqlalchemy.orm import Session
+from database import dialect_insert
 from models import User, DailyActivity
+from data_version import NEXT_DATA_VERSION
 
 
 # XP required for each level (exponential scaling)
@@ -11,125 +15,241 @@ def get_xp_for_level(level: int) -> int:
     return int(100 * (level ** 1.5))
 
 
-def get_level_from_xp(xp: int) -> int:
-    level = 1
+# Thresholds for levels 2..LEVEL_TABLE_MAX (covers XP up to ~1e9)
+LEVEL_TABLE_MAX = 50000
+_LEVEL_THRESHOLDS = [get_xp_for_level(level) for level in range(2, LEVEL_TABLE_MAX + 1)]
+
+
+def _level_from_formula(xp: int) -> int:
+    """Closed-form inverse of get_xp_for_level, corrected at the boundaries"""
+    level = max(1, int((xp / 100) ** (2 / 3)))
     while get_xp_for_level(level + 1) <= xp:
         level += 1
+    while level > 1 and get_xp_for_level(level) > xp:
+        level -= 1
     return level
 
 
+def get_level_from_xp(xp: int) -> int:
+    if xp < _LEVEL_THRESHOLDS[-1]:
+        return 1 + bisect_right(_LEVEL_THRESHOLDS, xp)
+    return _level_from_formula(xp)
+
+
+def get_levels_from_xp(xp_values) -> list:
+    """Batch variant of get_level_from_xp for bulk recomputation jobs"""
+    thresholds, top = _LEVEL_THRESHOLDS, _LEVEL_THRESHOLDS[-1]
+    return [
+        1 + bisect_right(thresholds, xp) if xp < top else _level_from_formula(xp)
+        for xp in xp_values
+    ]
+
+
 def award_xp(db: Session, user: User, xp_amount: int) -> dict:
-    """Award XP to user and handle level ups"""
-    old_level = user.level
-    user.xp_points += xp_amount
-    new_level = get_level_from_xp(user.xp_points)
-    
+    """Award XP to user and handle level ups.
+
+    Uses in-place SQL increments and does not commit, so concurrent awards
+    never overwrite each other and the caller controls the transaction.
+    """
+    total_xp, old_level = db.execute(
+        update(User).where(User.id == user.id).values(
+            xp_points=User.xp_points + xp_amount,
+            data_version=NEXT_DATA_VERSION
+        ).returning(User.xp_points, User.level).execution_options(synchronize_session=False)
+    ).one()
+
+    new_level = get_level_from_xp(total_xp)
     level_up = new_level > old_level
     if level_up:
-        user.level = new_level
-    
-    db.commit()
-    
+        # Never lower a level raised by a concurrent award
+        db.execute(
+            update(User).where(User.id == user.id).values(
+                level=case((User.level < new_level, new_level), else_=User.level)
+            ).execution_options(synchronize_session=False)
+        )
+
+    level = max(new_level, old_level)
     return {
         "xp_earned": xp_amount,
-        "total_xp": user.xp_points,
-        "level": user.level,
+        "total_xp": total_xp,
+        "level": level,
         "level_up": level_up,
-        "xp_for_next_level": get_xp_for_level(user.level + 1)
+        "xp_for_next_level": get_xp_for_level(level + 1)
     }
 
 
 def update_streak(db: Session, user: User) -> dict:
-    """Update user's streak based on activity"""
+    """Update user's streak based on activity (atomic, does not commit)"""
     today = date.today()
     yesterday = today - timedelta(days=1)
     
-    if user.last_activity_date == today:
+    new_streak = case(
         # Already logged activity today
-        return {
-            "current_streak": user.current_streak,
-            "longest_streak": user.longest_streak,
-            "streak_maintained": True
-        }
-    
-    if user.last_activity_date == yesterday:
+        (User.last_activity_date >= today, User.current_streak),
         # Continuing streak
-        user.current_streak += 1
-    elif user.last_activity_date is None or user.last_activity_date < yesterday:
+        (User.last_activity_date == yesterday, User.current_streak + 1),
         # Streak broken or first activity
-        user.current_streak = 1
-    
-    # Update longest streak if needed
-    if user.current_streak > user.longest_streak:
-        user.longest_streak = user.current_streak
-    
-    user.last_activity_date = today
-    db.commit()
+        else_=1
+    )
+
+    current_streak, longest_streak = db.execute(
+        update(User).where(User.id == user.id).values(
+            current_streak=new_streak,
+            longest_streak=case(
+                (User.longest_streak < new_streak, new_streak), else_=User.longest_streak
+            ),
+            last_activity_date=today,
+            data_version=NEXT_DATA_VERSION
+        ).returning(User.current_streak, User.longest_streak).execution_options(synchronize_session=False)
+    ).one()
     
     return {
-        "current_streak": user.current_streak,
-        "longest_streak": user.longest_streak,
+        "current_streak": current_streak,
+        "longest_streak": longest_streak,
         "streak_maintained": True
     }
 
 
+def _daily_activity_upsert(db: Session):
+    """INSERT ... ON CONFLICT(user_id, date) DO UPDATE with additive counters"""
+    insert = dialect_insert(db)
+    stmt = insert(DailyActivity).values(
+        user_id=bindparam("user_id"),
+        date=bindparam("date"),
+        tasks_created=bindparam("tasks_created"),
+        tasks_completed=bindparam("tasks_completed"),
+        minutes_spent=bindparam("minutes_spent"),
+        xp_earned=bindparam("xp_earned")
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "date"],
+        set_={
+            "tasks_created": DailyActivity.tasks_created + stmt.excluded.tasks_created,
+            "tasks_completed": DailyActivity.tasks_completed + stmt.excluded.tasks_completed,
+            "minutes_spent": DailyActivity.minutes_spent + stmt.excluded.minutes_spent,
+            "xp_earned": DailyActivity.xp_earned + stmt.excluded.xp_earned
+        }
+    )
+
+
+def activity_day() -> date:
+    """Today's day in the daily activity rollup.
+
+    The UTC date, the same basis as func.date() over the UTC task timestamps
+    that trends.py uses for backfills and deletes.
+    """
+    return datetime.now(timezone.utc).date()
+
+
 def log_daily_activity(db: Session, user: User, tasks_completed: int = 0, 
-                        minutes_spent: int = 0, xp_earned: int = 0) -> DailyActivity:
-    """Log or update daily activity for heatmap"""
-    today = date.today()
-    
-    # Check if activity exists for today
-    activity = db.query(DailyActivity).filter(
-        DailyActivity.user_id == user.id,
-        DailyActivity.date == today
-    ).first()
-    
-    if activity:
-        activity.tasks_completed += tasks_completed
-        activity.minutes_spent += minutes_spent
-        activity.xp_earned += xp_earned
-    else:
-        activity = DailyActivity(
-            user_id=user.id,
-            date=today,
-            tasks_completed=tasks_completed,
-            minutes_spent=minutes_spent,
-            xp_earned=xp_earned
-        )
-        db.add(activity)
-    
-    db.commit()
-    return activity
+                        minutes_spent: int = 0, xp_earned: int = 0,
+                        tasks_created: int = 0) -> None:
+    """Log or update today's activity rollup (single upsert, does not commit).
 
+    Always paired with award_xp or a task counter update, which bump the
+    user's data version.
+    """
+    log_daily_activities(
+        db, [(user.id, activity_day(), tasks_completed, minutes_spent, xp_earned, tasks_created)]
+    )
 
-def get_activity_heatmap(db: Session, user: User, days: int = 365) -> list:
-    """Get activity data for heatmap visualization"""
-    end_date = date.today()
-    start_date = end_date - timedelta(days=days)
-    
-    activities = db.query(DailyActivity).filter(
+
+def log_daily_activities(db: Session, entries) -> None:
+    """Apply many ``(user_id, date, tasks_completed, minutes_spent, xp_earned,
+    tasks_created)`` deltas in one executemany, e.g. for backfills. Does not
+    commit or bump data versions.
+
+    Deltas for the same user and day are summed first: Postgres batches the
+    executemany into one INSERT, and ON CONFLICT DO UPDATE fails when a
+    statement touches the same row twice.
+    """
+    totals = {}
+    for user_id, day, tasks_completed, minutes_spent, xp_earned, tasks_created in entries:
+        params = totals.get((user_id, day))
+        if params is None:
+            params = totals[(user_id, day)] = {
+                "user_id": user_id,
+                "date": day,
+                "tasks_created": 0,
+                "tasks_completed": 0,
+                "minutes_spent": 0,
+                "xp_earned": 0
+            }
+        params["tasks_created"] += tasks_created or 0
+        params["tasks_completed"] += tasks_completed or 0
+        params["minutes_spent"] += minutes_spent or 0
+        params["xp_earned"] += xp_earned or 0
+
+    params = list(totals.values())
+    if params:
+        db.execute(_daily_activity_upsert(db), params)
+
+
+# Longest range a single heatmap request may cover (~10 years)
+MAX_HEATMAP_DAYS = 3660
+
+
+def get_activity_heatmap_columns(db: Session, user: User,
+                                 start_date: date, end_date: date) -> dict:
+    """Heatmap for ``start_date``..``end_date`` (inclusive) as parallel arrays.
+
+    Index ``i`` of every array is the day ``start + i``. Missing days are
+    zero-filled by offset into preallocated arrays rather than by walking
+    the calendar, so the work scales with the number of active days.
+    """
+    n = max((end_date - start_date).days + 1, 0)
+    tasks, minutes, xp = [0] * n, [0] * n, [0] * n
+
+    rows = db.query(
+        DailyActivity.date,
+        DailyActivity.tasks_completed,
+        DailyActivity.minutes_spent,
+        DailyActivity.xp_earned
+    ).filter(
         DailyActivity.user_id == user.id,
         DailyActivity.date >= start_date,
         DailyActivity.date <= end_date
     ).all()
-    
-    # Create a dict for quick lookup
-    activity_map = {a.date: a for a in activities}
-    
-    result = []
-    current = start_date
-    while current <= end_date:
-        activity = activity_map.get(current)
-        result.append({
-            "date": current.isoformat(),
-            "tasks_completed": activity.tasks_completed if activity else 0,
-            "minutes_spent": activity.minutes_spent if activity else 0,
-            "xp_earned": activity.xp_earned if activity else 0,
-            "intensity": min(4, (activity.tasks_completed if activity else 0))  # 0-4 scale for heatmap
-        })
-        current += timedelta(days=1)
-    
-    return result
+
+    for day, tasks_completed, minutes_spent, xp_earned in rows:
+        i = (day - start_date).days
+        tasks[i] = tasks_completed or 0
+        minutes[i] = minutes_spent or 0
+        xp[i] = xp_earned or 0
+
+    return {
+        "start": start_date.isoformat(),
+        "days": n,
+        "tasks_completed": tasks,
+        "minutes_spent": minutes,
+        "xp_earned": xp,
+        "intensity": [t if t < 4 else 4 for t in tasks]  # 0-4 scale for heatmap
+    }
+
+
+def heatmap_columns_to_rows(columns: dict) -> list:
+    """Expand the columnar heatmap into the original one-dict-per-day shape"""
+    start = date.fromisoformat(columns["start"])
+    return [
+        {
+            "date": (start + timedelta(days=i)).isoformat(),
+            "tasks_completed": tasks_completed,
+            "minutes_spent": minutes_spent,
+            "xp_earned": xp_earned,
+            "intensity": intensity
+        }
+        for i, (tasks_completed, minutes_spent, xp_earned, intensity) in enumerate(zip(
+            columns["tasks_completed"], columns["minutes_spent"],
+            columns["xp_earned"], columns["intensity"]
+        ))
+    ]
+
+
+def get_activity_heatmap(db: Session, user: User, days: int = 365) -> list:
+    """Get activity data for heatmap visualization"""
+    end_date = activity_day()
+    start_date = end_date - timedelta(days=days)
+    return heatmap_columns_to_rows(get_activity_heatmap_columns(db, user, start_date, end_date))
 
 
 def get_user_stats(db: Session, user: User) -> dict:
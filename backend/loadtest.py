@@ -0,0 +1,177 @@
+"""
+Load Test - Concurrent clients against a running API server
+
+Seeds a few users with skills and tasks, then keeps ``--clients`` concurrent
+connections busy for ``--duration`` seconds and reports throughput and
+latency percentiles as JSON. With ``--write-ratio`` a share of requests
+bulk-create tasks instead, and reads and writes are reported separately.
+
+``--login-clients`` adds a login storm: that many more clients loop on
+/auth/login, backing off for Retry-After on 503. With ``--max-p95-ms`` the
+run exits with status 1 when the other requests' p95 goes over it:
+
+    uvicorn main:app --port 8000
+    python loadtest.py --url http://localhost:8000 --clients 500 --duration 20
+    python loadtest.py --clients 50 --write-ratio 0.3
+    python loadtest.py --clients 1 --paths /dashboard/overview --login-clients 60 --max-p95-ms 100
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+
+import httpx
+
+
+DEFAULT_PATHS = ["/dashboard/bundle", "/skills/", "/dashboard/overview"]
+
+PASSWORD = "load-pass"
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def seed_user(client: httpx.AsyncClient, skills: int, tasks: int) -> tuple:
+    email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+    await client.post("/auth/register", json={"name": "load", "email": email, "password": PASSWORD})
+    token = (await client.post(
+        "/auth/login", json={"email": email, "password": PASSWORD}
+    )).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    skill_id = None
+    for i in range(skills):
+        skill_id = (await client.post(
+            "/skills/", headers=headers, json={"name": f"skill-{i}"}
+        )).json()["id"]
+        await client.post(
+            f"/tasks/{skill_id}/bulk", headers=headers,
+            json={"tasks": [{"title": f"task-{j}"} for j in range(tasks)]}
+        )
+    return headers, skill_id, email
+
+
+async def run_client(args, users, deadline, latencies, errors):
+    # One connection per simulated client, like separate browsers
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        while time.perf_counter() < deadline:
+            await run_request(client, users, args, latencies, errors)
+
+
+async def run_request(client, users, args, latencies, errors):
+    headers, skill_id, _email = random.choice(users)
+    kind = "write" if random.random() < args.write_ratio else "read"
+    started = time.perf_counter()
+    try:
+        if kind == "write":
+            response = await client.post(
+                f"/tasks/{skill_id}/bulk", headers=headers,
+                json={"tasks": [{"title": "load-write"}] * args.write_batch}
+            )
+        else:
+            response = await client.get(random.choice(args.paths), headers=headers)
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    if ok:
+        latencies[kind].append(time.perf_counter() - started)
+    else:
+        errors.append(1)
+
+
+async def run_login_client(args, users, deadline, logins):
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        while time.perf_counter() < deadline:
+            _headers, _skill_id, email = random.choice(users)
+            started = time.perf_counter()
+            try:
+                response = await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+            except httpx.HTTPError:
+                logins["errors"] += 1
+                continue
+            if response.status_code == 503:
+                logins["rejected"] += 1
+                await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+            elif response.status_code < 400:
+                logins["latencies"].append(time.perf_counter() - started)
+            else:
+                logins["errors"] += 1
+
+
+def summarize(latencies: list, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+async def main(args) -> dict:
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        users = [await seed_user(client, args.skills, args.tasks) for _ in range(args.users)]
+
+    latencies, errors = {"read": [], "write": []}, []
+    logins = {"latencies": [], "rejected": 0, "errors": 0}
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(
+        *(run_client(args, users, deadline, latencies, errors) for _ in range(args.clients)),
+        *(run_login_client(args, users, deadline, logins) for _ in range(args.login_clients))
+    )
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "clients": args.clients,
+        "duration_s": round(elapsed, 2),
+        "errors": len(errors),
+        **summarize(latencies["read"] + latencies["write"], elapsed),
+    }
+    if args.write_ratio:
+        report["reads"] = summarize(latencies["read"], elapsed)
+        report["writes"] = summarize(latencies["write"], elapsed)
+    if args.login_clients:
+        report["logins"] = {
+            "clients": args.login_clients,
+            **summarize(logins["latencies"], elapsed),
+            "rejected_503": logins["rejected"],
+            "errors": logins["errors"],
+        }
+    if args.max_p95_ms is not None:
+        report["max_p95_ms"] = args.max_p95_ms
+        report["passed"] = report["errors"] == 0 and report["p95_ms"] <= args.max_p95_ms
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--skills", type=int, default=5)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--write-ratio", type=float, default=0.0,
+                        help="share of requests that bulk-create tasks instead of reading")
+    parser.add_argument("--write-batch", type=int, default=20,
+                        help="tasks created per write request")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--login-clients", type=int, default=0,
+                        help="extra clients looping on /auth/login alongside the others")
+    parser.add_argument("--max-p95-ms", type=float, default=None,
+                        help="exit with status 1 if the non-login p95 exceeds this or any request fails")
+
+    report = asyncio.run(main(parser.parse_args()))
+    print(json.dumps(report, indent=2))
+    if report.get("passed") is False:
+        sys.exit(1)
@@ -1,16 +1,47 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from auth import router as auth_router
 from skills import router as skills_router
 from tasks import router as tasks_router
 from dashboard import router as dashboard_router
-from database import engine, Base
+from admin import router as admin_router
+from database import engine, async_engine, SessionLocal
+from migrations import run_migrations
+from rank_index import load_rank_index, start_refresher
+from pagination import NEXT_CURSOR_HEADER
+from query_stats import QueryStatsMiddleware, QUERY_STATS_HEADERS, instrument_engine
+import metrics
+from profiler import ProfilerMiddleware, PROFILE_ID_HEADER
+from fast_json import FastJSONResponse
+
+# Create database tables and upgrade existing databases
+run_migrations(engine)
+
+# Build the in-memory leaderboard from the users table
+with SessionLocal() as db:
+    load_rank_index(db)
+
+# Count and time every statement per request (see query_stats.py)
+for _engine in (engine, async_engine.sync_engine):
+    instrument_engine(_engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    metrics.start_flusher()
+    # Pick up other workers' XP changes without reloading inside requests
+    start_refresher()
+    yield
+    metrics.flush()
+    # Pooled aiosqlite connections each hold a thread until closed
+    await async_engine.dispose()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Skill Tracker API")
+# orjson rendering for every route (see fast_json.py for skipping the encoder too)
+app = FastAPI(title="Skill Tracker API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # CORS - Allow frontend to connect
 app.add_middleware(
@@ -19,15 +50,32 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, PROFILE_ID_HEADER, *QUERY_STATS_HEADERS],
 )
 
+# Opt-in sampling profiles of single requests (see profiler.py)
+app.add_middleware(ProfilerMiddleware)
+
+# Added last so it wraps everything else, CORS included
+app.add_middleware(QueryStatsMiddleware)
+
 # Include routers
 app.include_router(auth_router)
 app.include_router(skills_router)
 app.include_router(tasks_router)
 app.include_router(dashboard_router)
+app.include_router(admin_router)
 
 
 @app.get("/")
 def root():
-    return {"message": "Skill Tracker API is running"}
\ No newline at end of file
+    return {"message": "Skill Tracker API is running"}
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    # Summed over every worker when METRICS_DIR is set (see metrics.py)
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# Latency, status and in-flight metrics per route template
+metrics.instrument_routes(app)
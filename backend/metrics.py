@@ -0,0 +1,370 @@
+"""
+Metrics Service - Prometheus text-format metrics without locks on the hot path
+
+Every thread records into its own shard (plain dicts reached through a
+threading.local), so recording a sample is a couple of dict operations and
+never waits on another request. A scrape sums the shards; copying a dict is
+atomic under the GIL, so the scraper needs no lock either.
+
+With several worker processes (uvicorn --workers N, gunicorn) set
+METRICS_DIR to a directory shared by the workers and empty at deploy time.
+Each process writes its totals there every METRICS_FLUSH_SECONDS, and a
+scrape of any worker merges its own live values with the other workers'
+latest files. Counters and histograms of exited workers are kept so totals
+never go backwards; their gauges are dropped.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Optional
+
+from sqlalchemy import exc
+
+
+METRICS_DIR = os.getenv("METRICS_DIR") or None
+
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+
+AI_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+# -------------------------------
+# Per-thread shards
+# -------------------------------
+_local = threading.local()
+
+_shards = []
+
+# Taken once per thread, when it records its first sample
+_shards_lock = threading.Lock()
+
+
+def _shard() -> dict:
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = {}
+        with _shards_lock:
+            _shards.append(shard)
+        return shard
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return self.name, tuple(str(labels[n]) for n in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        shard, key = _shard(), self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Summed across threads and live processes, so inc() and dec() may
+    happen on different threads"""
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        shard, key = _shard(), self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        shard, key = _shard(), self._key(labels)
+        # Per-bucket counts (not cumulative), then the +Inf bucket, sum and count
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+
+REGISTRY = []
+
+
+# -------------------------------
+# Metrics
+# -------------------------------
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests served, by route template and status",
+    ("method", "route", "status")
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to serve a request, by route template",
+    ("method", "route")
+)
+
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being served, by route template",
+    ("method", "route")
+)
+
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection",
+    ("engine",), buckets=POOL_WAIT_BUCKETS
+)
+
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT",
+    ("engine",)
+)
+
+AI_REQUEST_SECONDS = Histogram(
+    "ai_request_duration_seconds", "OpenAI chat completion latency, including failures",
+    ("outcome",), buckets=AI_LATENCY_BUCKETS
+)
+
+AI_REQUEST_FAILURES = Counter(
+    "ai_request_failures_total", "OpenAI chat completions that raised, by exception type",
+    ("error",)
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups, by cache and result (hit or miss)",
+    ("cache", "result")
+)
+
+
+# -------------------------------
+# Instrumentation helpers
+# -------------------------------
+def instrument_routes(app, skip=("/metrics",)) -> None:
+    """Wrap every route's ASGI app to record latency, status and in-flight
+    requests under its path template (e.g. /tasks/{skill_id})"""
+    for route in app.routes:
+        if getattr(route, "methods", None) and route.path not in skip:
+            route.app = _timed_route(route.app, route.path)
+
+
+def _timed_route(route_app, path: str):
+    async def app(scope, receive, send):
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method=method, route=path)
+        started = time.perf_counter()
+        try:
+            await route_app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=method, route=path)
+            HTTP_REQUESTS.inc(method=method, route=path, status=status)
+            HTTP_IN_FLIGHT.dec(method=method, route=path)
+
+    return app
+
+
+def timed_pool(pool_class, engine_name: str):
+    """Subclass of ``pool_class`` recording how long checkouts wait"""
+
+    class TimedPool(pool_class):
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                DB_POOL_TIMEOUTS.inc(engine=engine_name)
+                raise
+            finally:
+                DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started, engine=engine_name)
+
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# -------------------------------
+# Snapshots and multi-process merge
+# -------------------------------
+def _snapshot() -> dict:
+    """{(name, labels): value} summed over this process's shards"""
+    with _shards_lock:
+        shards = list(_shards)
+
+    totals = {}
+    for shard in shards:
+        for key, value in shard.copy().items():
+            if isinstance(value, list):
+                value = list(value)
+                current = totals.get(key)
+                totals[key] = value if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def _path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"metrics-{pid}.json")
+
+
+def flush() -> None:
+    """Write this process's totals to METRICS_DIR for the other workers' scrapes"""
+    if not METRICS_DIR:
+        return
+    path = _path(os.getpid())
+    with open(path + ".tmp", "w") as f:
+        json.dump([[name, list(labels), value] for (name, labels), value in _snapshot().items()], f)
+    os.replace(path + ".tmp", path)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _other_processes() -> list:
+    """[(snapshot, alive)] read from the other workers' files"""
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return []
+
+    snapshots = []
+    for filename in os.listdir(METRICS_DIR):
+        if not (filename.startswith("metrics-") and filename.endswith(".json")):
+            continue
+        pid = int(filename[len("metrics-"):-len(".json")])
+        if pid == os.getpid():
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, filename)) as f:
+                rows = json.load(f)
+        except (OSError, ValueError):
+            continue
+        snapshots.append(({(name, tuple(labels)): value for name, labels, value in rows}, _alive(pid)))
+    return snapshots
+
+
+def _merged() -> dict:
+    gauges = {m.name for m in REGISTRY if m.kind == "gauge"}
+    totals = _snapshot()
+    for snapshot, alive in _other_processes():
+        for key, value in snapshot.items():
+            if key[0] in gauges and not alive:
+                continue
+            current = totals.get(key)
+            if current is None:
+                totals[key] = value
+            elif isinstance(value, list):
+                totals[key] = [a + b for a, b in zip(current, value)]
+            else:
+                totals[key] = current + value
+    return totals
+
+
+_flusher: Optional[threading.Thread] = None
+
+
+def start_flusher() -> None:
+    """Flush this process's totals every METRICS_FLUSH_SECONDS (no-op without METRICS_DIR)"""
+    global _flusher
+    if not METRICS_DIR or _flusher is not None:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+    def run():
+        while True:
+            try:
+                flush()
+            except OSError:
+                pass
+            time.sleep(METRICS_FLUSH_SECONDS)
+
+    _flusher = threading.Thread(target=run, name="metrics-flush", daemon=True)
+    _flusher.start()
+
+
+# -------------------------------
+# Text exposition
+# -------------------------------
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render() -> str:
+    totals = _merged()
+    by_metric = {}
+    for (name, labels), value in totals.items():
+        by_metric.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, value in sorted(by_metric.get(metric.name, [])):
+            if metric.kind != "histogram":
+                lines.append(f"{metric.name}{_labels(metric.labelnames, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + ("+Inf",), value):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{metric.name}_bucket{_labels(metric.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{metric.name}_sum{_labels(metric.labelnames, labels)} {_number(value[-2])}")
+            lines.append(f"{metric.name}_count{_labels(metric.labelnames, labels)} {value[-1]}")
+
+    # Derived from cache_requests_total so it is correct across workers too
+    lines.append("# HELP cache_hit_ratio Share of cache lookups that hit")
+    lines.append("# TYPE cache_hit_ratio gauge")
+    lookups = {}
+    for (cache, result), value in by_metric.get(CACHE_REQUESTS.name, []):
+        hits, total = lookups.get(cache, (0, 0))
+        lookups[cache] = (hits + (value if result == "hit" else 0), total + value)
+    for cache, (hits, total) in sorted(lookups.items()):
+        lines.append(f'cache_hit_ratio{{cache="{_escape(cache)}"}} {_number(hits / total if total else 0.0)}')
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,140 @@
+"""
+Schema Migrations - Versioned, idempotent upgrades applied at startup
+"""
+from sqlalchemy import Column, Integer, MetaData, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+import models  # noqa: F401  (registers every table on Base.metadata)
+from database import Base
+from skill_stats import recompute_task_counters
+from trends import backfill_daily_rollups
+
+
+version_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    version_metadata,
+    Column("version", Integer, nullable=False)
+)
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str) -> None:
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _add_task_counters(conn: Connection) -> None:
+    """Denormalized task counters on skills and users"""
+    for table in ("skills", "users"):
+        for column in ("task_count", "completed_count", "pending_minutes"):
+            _add_column(conn, table, column, "INTEGER DEFAULT 0")
+
+    # The session joins the migration's transaction instead of committing it
+    recompute_task_counters(Session(bind=conn))
+
+
+def _merge_duplicate_daily_activities(conn: Connection) -> None:
+    """Fold duplicate (user_id, date) rows into the oldest one"""
+    conn.execute(text("""
+        UPDATE daily_activities SET
+            tasks_completed = (SELECT SUM(d.tasks_completed) FROM daily_activities d
+                               WHERE d.user_id = daily_activities.user_id AND d.date = daily_activities.date),
+            minutes_spent = (SELECT SUM(d.minutes_spent) FROM daily_activities d
+                             WHERE d.user_id = daily_activities.user_id AND d.date = daily_activities.date),
+            xp_earned = (SELECT SUM(d.xp_earned) FROM daily_activities d
+                         WHERE d.user_id = daily_activities.user_id AND d.date = daily_activities.date)
+        WHERE id IN (SELECT MIN(id) FROM daily_activities GROUP BY user_id, date HAVING COUNT(*) > 1)
+    """))
+    conn.execute(text("""
+        DELETE FROM daily_activities
+        WHERE id NOT IN (SELECT MIN(id) FROM daily_activities GROUP BY user_id, date)
+    """))
+
+
+def _create_index(conn: Connection, name: str, table: str, columns: tuple, unique: bool = False) -> None:
+    # Spelled out per migration rather than read from the models, so an old
+    # database upgrades through the schema each migration was written against
+    conn.execute(text(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+    ))
+
+
+def _add_hot_query_indexes(conn: Connection) -> None:
+    """Composite indexes for dashboard filters and a unique daily activity key"""
+    _merge_duplicate_daily_activities(conn)
+    _create_index(conn, "ix_users_xp_points", "users", ("xp_points",))
+    _create_index(conn, "ix_skills_user_id", "skills", ("user_id",))
+    _create_index(conn, "ix_tasks_user_skill_completed", "tasks", ("user_id", "skill_id", "is_completed"))
+    _create_index(conn, "ix_tasks_user_created", "tasks", ("user_id", "created_at"))
+    _create_index(conn, "ix_daily_activities_user_date", "daily_activities", ("user_id", "date"), unique=True)
+
+
+def _add_data_version(conn: Connection) -> None:
+    """Per-user change counter used for ETags"""
+    _add_column(conn, "users", "data_version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _add_pagination_indexes(conn: Connection) -> None:
+    """(owner, created_at, id) indexes behind keyset pagination"""
+    _create_index(conn, "ix_skills_user_created", "skills", ("user_id", "created_at", "id"))
+    _create_index(conn, "ix_tasks_skill_created", "tasks", ("skill_id", "created_at", "id"))
+
+
+def _add_tasks_created_rollup(conn: Connection) -> None:
+    """Tasks created per day in the daily activity rollup"""
+    _add_column(conn, "daily_activities", "tasks_created", "INTEGER DEFAULT 0")
+
+    backfill_daily_rollups(Session(bind=conn))
+
+
+# (version, description, upgrade) - append only, never renumber
+MIGRATIONS = [
+    (1, "Task counters on skills and users", _add_task_counters),
+    (2, "Composite indexes for hot query shapes", _add_hot_query_indexes),
+    (3, "Per-user data version", _add_data_version),
+    (4, "Keyset pagination indexes", _add_pagination_indexes),
+    (5, "Tasks created in the daily rollup", _add_tasks_created_rollup),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: Connection) -> int:
+    version = conn.execute(select(schema_version.c.version)).scalar()
+    return version or 0
+
+
+def _set_schema_version(conn: Connection, version: int) -> None:
+    conn.execute(schema_version.delete())
+    conn.execute(schema_version.insert().values(version=version))
+
+
+def run_migrations(engine: Engine) -> int:
+    """Create missing tables and apply pending migrations, returning the schema version"""
+    with engine.begin() as conn:
+        fresh = not inspect(conn).has_table("users")
+
+        # New databases get the current schema directly
+        Base.metadata.create_all(conn)
+        version_metadata.create_all(conn)
+        if fresh:
+            _set_schema_version(conn, LATEST_VERSION)
+            return LATEST_VERSION
+
+        version = get_schema_version(conn)
+        for target, _description, upgrade in MIGRATIONS:
+            if target > version:
+                upgrade(conn)
+                _set_schema_version(conn, target)
+                version = target
+
+        return version
+
+
+if __name__ == "__main__":
+    # Upgrade command: python migrations.py
+    from database import engine
+
+    print(f"Schema at version {run_migrations(engine)}")
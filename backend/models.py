@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Boolean, Float, Date
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Boolean, Float, Date, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime, timezone
@@ -13,11 +13,19 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     
     # Gamification
-    xp_points = Column(Integer, default=0)
+    xp_points = Column(Integer, default=0, index=True)  # leaderboard ordering
     level = Column(Integer, default=1)
     current_streak = Column(Integer, default=0)
     longest_streak = Column(Integer, default=0)
     last_activity_date = Column(Date, nullable=True)
+
+    # Denormalized task counters (see skill_stats.recompute_task_counters)
+    task_count = Column(Integer, default=0)
+    completed_count = Column(Integer, default=0)
+    pending_minutes = Column(Integer, default=0)
+
+    # Bumped by every write to the user's data (see data_version.py)
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
@@ -35,9 +43,13 @@ SKILL_CATEGORIES = [
 
 class Skill(Base):
     __tablename__ = "skills"
+    __table_args__ = (
+        # Keyset pagination of a user's skills (see pagination.py)
+        Index("ix_skills_user_created", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     name = Column(String, nullable=False)
     description = Column(Text)
     category = Column(String, default="other")
@@ -47,6 +59,11 @@ class Skill(Base):
     goal_date = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
+    # Denormalized task counters (see skill_stats.recompute_task_counters)
+    task_count = Column(Integer, default=0)
+    completed_count = Column(Integer, default=0)
+    pending_minutes = Column(Integer, default=0)
+
     user = relationship("User", back_populates="skills")
     tasks = relationship("Task", back_populates="skill", cascade="all, delete-orphan")
     milestones = relationship("Milestone", back_populates="skill", cascade="all, delete-orphan")
@@ -54,6 +71,11 @@ class Skill(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_user_skill_completed", "user_id", "skill_id", "is_completed"),
+        Index("ix_tasks_user_created", "user_id", "created_at"),
+        Index("ix_tasks_skill_created", "skill_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
@@ -87,12 +109,17 @@ class Milestone(Base):
 
 
 class DailyActivity(Base):
-    """Tracks daily activity for heatmap"""
+    """Per-user daily rollup behind the heatmap and trend endpoints"""
     __tablename__ = "daily_activities"
+    __table_args__ = (
+        # One row per user per day; also serves the heatmap range scans
+        Index("ix_daily_activities_user_date", "user_id", "date", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     date = Column(Date, nullable=False)
+    tasks_created = Column(Integer, default=0)
     tasks_completed = Column(Integer, default=0)
     minutes_spent = Column(Integer, default=0)
     xp_earned = Column(Integer, default=0)
@@ -115,9 +142,30 @@ class LearningSession(Base):
     user = relationship("User", back_populates="learning_sessions")
 
 
+class AIPlanCache(Base):
+    """Generated AI learning plans, keyed by a hash of their inputs"""
+    __tablename__ = "ai_plan_cache"
+    __table_args__ = (
+        Index("ix_ai_plan_cache_user_key", "user_id", "cache_key", unique=True),
+    )
 
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    cache_key = Column(String(64), nullable=False)  # sha256 hex digest
+    plan = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    last_used_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
 
 
+class AIPlanJob(Base):
+    """Background AI plan generations, visible to every worker process"""
+    __tablename__ = "ai_plan_jobs"
+    __table_args__ = (
+        Index("ix_ai_plan_jobs_user_status", "user_id", "status"),
+    )
 
-
-
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(String(16), nullable=False, default="pending")  # pending | done | failed
+    result = Column(Text)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
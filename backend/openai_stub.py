@@ -0,0 +1,51 @@
+"""
+OpenAI Stub - Local OpenAI-compatible chat completions server for development
+
+Run:  uvicorn openai_stub:app --port 9000
+Then: OPENAI_BASE_URL=http://localhost:9000/v1
+
+STUB_LATENCY_SECONDS and STUB_FAILURE_RATE inject delay and 500 errors.
+"""
+import asyncio
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, HTTPException, Request
+
+
+STUB_LATENCY_SECONDS = float(os.getenv("STUB_LATENCY_SECONDS", "0"))
+
+STUB_FAILURE_RATE = float(os.getenv("STUB_FAILURE_RATE", "0"))
+
+app = FastAPI(title="OpenAI Stub")
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+
+    if STUB_LATENCY_SECONDS:
+        await asyncio.sleep(STUB_LATENCY_SECONDS)
+
+    if random.random() < STUB_FAILURE_RATE:
+        raise HTTPException(status_code=500, detail="Injected failure")
+
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {
+                    "role": "assistant",
+                    "content": "Day 1-7: finish one task per skill each day."
+                },
+                "finish_reason": "stop"
+            }
+        ],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
@@ -0,0 +1,74 @@
+"""
+Pagination Service - Keyset pagination on (created_at, id) with opaque cursors
+
+A cursor encodes the sort key of the last row of a page. The next page is
+``WHERE (created_at, id) > cursor ORDER BY created_at, id LIMIT n``, which
+stays an index range scan however deep the client pages, and is stable
+when rows are added while paging.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import tuple_
+from sqlalchemy.sql import Select
+
+
+DEFAULT_PAGE_SIZE = 100
+
+MAX_PAGE_SIZE = 500
+
+# Response header carrying the cursor of the next page, absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+_CURSOR_VERSION = 1
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    payload = json.dumps([_CURSOR_VERSION, created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        version, created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if version != _CURSOR_VERSION or not isinstance(row_id, int):
+            raise ValueError(cursor)
+        return datetime.fromisoformat(created_at), row_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class PageParams:
+    """Query parameters shared by every paginated listing"""
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None
+    ):
+        self.limit = limit
+        self.after = decode_cursor(cursor) if cursor else None
+
+
+def paginate(stmt: Select, model, page: PageParams) -> Select:
+    """Order ``stmt`` by (created_at, id) and restrict it to one page.
+
+    Fetches one extra row so finish_page can tell whether another page exists.
+    """
+    if page.after is not None:
+        # A plain tuple on the right picks up the column types for its binds
+        stmt = stmt.where(tuple_(model.created_at, model.id) > page.after)
+    return stmt.order_by(model.created_at, model.id).limit(page.limit + 1)
+
+
+def finish_page(rows: list, page: PageParams, response: Response) -> list:
+    """Trim the look-ahead row and advertise the next cursor, if any"""
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
+    return rows
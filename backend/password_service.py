@@ -0,0 +1,90 @@
+"""
+Password Service - bcrypt hashing on a bounded worker process pool
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+
+# Hashes queued or running at once; keep well below the request threadpool size
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "8"))
+
+
+@lru_cache(maxsize=None)
+def _get_context(rounds: int) -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+# Run inside the worker processes
+def _hash(password: str, rounds: int) -> str:
+    return _get_context(rounds).hash(password)
+
+
+def _verify_and_update(password: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return _get_context(rounds).verify_and_update(password, hashed)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_MAX_PENDING)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS)
+        return _executor
+
+
+def _run(fn, *args):
+    """Run fn on the pool, rejecting with 503 instead of queueing past the cap"""
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=503,
+            detail="Too many concurrent sign-ins, please retry",
+            headers={"Retry-After": "1"}
+        )
+    try:
+        return _get_executor().submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+async def _run_async(fn, *args):
+    """_run for the event loop: awaits the pool without holding a thread"""
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=503,
+            detail="Too many concurrent sign-ins, please retry",
+            headers={"Retry-After": "1"}
+        )
+    try:
+        return await asyncio.wrap_future(_get_executor().submit(fn, *args))
+    finally:
+        _slots.release()
+
+
+def hash_password(password: str) -> str:
+    return _run(_hash, password, BCRYPT_ROUNDS)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_async(_hash, password, BCRYPT_ROUNDS)
+
+
+async def verify_password_async(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """Check a password; also returns a new hash when the stored cost is outdated"""
+    return await _run_async(_verify_and_update, password, hashed, BCRYPT_ROUNDS)
@@ -0,0 +1,117 @@
+"""
+Plan Cache Service - Content-addressed cache of generated AI learning plans
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import dialect_insert
+from models import AIPlanCache
+from metrics import record_cache_lookup
+
+
+AI_PLAN_CACHE_TTL_SECONDS = int(os.getenv("AI_PLAN_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+AI_PLAN_CACHE_MAX_ENTRIES = int(os.getenv("AI_PLAN_CACHE_MAX_ENTRIES", "10000"))
+
+# A hit only rewrites last_used_at once it is older than this, so most hits
+# stay reads and never take SQLite's write lock
+AI_PLAN_CACHE_TOUCH_SECONDS = 300
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _normalize(skills) -> str:
+    if isinstance(skills, str):
+        lines = (" ".join(line.split()) for line in skills.splitlines())
+        return "\n".join(sorted(line for line in lines if line))
+    return json.dumps(skills, sort_keys=True, separators=(",", ":"))
+
+
+def make_cache_key(skills, model_params: dict) -> str:
+    """sha256 of the normalized skills summary plus the generation parameters"""
+    payload = json.dumps(
+        {"skills": _normalize(skills), "params": model_params},
+        sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def get_cached_plan(db: Session, user_id: int, cache_key: str) -> Optional[str]:
+    now = datetime.now(timezone.utc)
+    entry = db.query(AIPlanCache).filter(
+        AIPlanCache.user_id == user_id,
+        AIPlanCache.cache_key == cache_key,
+        AIPlanCache.created_at >= now - timedelta(seconds=AI_PLAN_CACHE_TTL_SECONDS)
+    ).first()
+
+    record_cache_lookup("ai_plan", entry is not None)
+    if not entry:
+        _count("misses")
+        return None
+
+    _count("hits")
+    last_used_at = entry.last_used_at
+    if last_used_at is not None and last_used_at.tzinfo is None:
+        # SQLite hands back naive UTC datetimes
+        last_used_at = last_used_at.replace(tzinfo=timezone.utc)
+    if last_used_at is None or now - last_used_at > timedelta(seconds=AI_PLAN_CACHE_TOUCH_SECONDS):
+        entry.last_used_at = now
+        db.commit()
+    return entry.plan
+
+
+def store_plan(db: Session, user_id: int, cache_key: str, plan: str) -> None:
+    now = datetime.now(timezone.utc)
+    insert = dialect_insert(db)
+    stmt = insert(AIPlanCache).values(
+        user_id=user_id, cache_key=cache_key, plan=plan, created_at=now, last_used_at=now
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id", "cache_key"],
+        set_={"plan": plan, "created_at": now, "last_used_at": now}
+    ))
+
+    # Expired entries, then least recently used ones beyond the size cap
+    db.query(AIPlanCache).filter(
+        AIPlanCache.last_used_at < now - timedelta(seconds=AI_PLAN_CACHE_TTL_SECONDS)
+    ).delete(synchronize_session=False)
+
+    overflow = db.query(func.count(AIPlanCache.id)).scalar() - AI_PLAN_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        stale_ids = db.query(AIPlanCache.id).order_by(
+            AIPlanCache.last_used_at
+        ).limit(overflow).scalar_subquery()
+        db.query(AIPlanCache).filter(AIPlanCache.id.in_(stale_ids)).delete(synchronize_session=False)
+
+    db.commit()
+
+
+def invalidate_user_plans(db: Session, user_id: int) -> None:
+    """Drop a user's cached plans; does not commit (runs inside the caller's write)"""
+    db.query(AIPlanCache).filter(
+        AIPlanCache.user_id == user_id
+    ).delete(synchronize_session=False)
+
+
+def get_cache_stats() -> dict:
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / lookups, 4) if lookups else 0
+    }
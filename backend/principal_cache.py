@@ -0,0 +1,87 @@
+"""
+Principal Cache - Bounded TTL cache of verified tokens for get_current_user
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from models import User
+from metrics import record_cache_lookup
+
+
+@dataclass(frozen=True)
+class Principal:
+    user_id: int
+    email: str
+    expires_at: float
+
+
+class PrincipalCache:
+    """LRU cache of token -> Principal with a per-entry expiry"""
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            principal = self._entries.get(token)
+            if principal is None or principal.expires_at <= time.monotonic():
+                if principal is not None:
+                    del self._entries[token]
+                self.misses += 1
+                record_cache_lookup("auth_principal", False)
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            record_cache_lookup("auth_principal", True)
+            return principal
+
+    def set(self, token: str, user_id: int, email: str, token_exp: Optional[float] = None) -> None:
+        """Cache a verified token, never past the token's own ``exp`` claim"""
+        ttl = self.ttl_seconds
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[token] = Principal(user_id, email, time.monotonic() + ttl)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for token in [t for t, p in self._entries.items() if p.user_id == user_id]:
+                del self._entries[token]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache(
+    max_size=int(os.getenv("AUTH_CACHE_MAX_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+)
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_on_identity_change(mapper, connection, target):
+    # XP, streak and counter updates leave cached principals valid
+    if inspect(target).attrs.email.history.has_changes():
+        principal_cache.invalidate_user(target.id)
+
+
+@event.listens_for(User, "after_delete")
+def _invalidate_on_delete(mapper, connection, target):
+    principal_cache.invalidate_user(target.id)
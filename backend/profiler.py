@@ -0,0 +1,261 @@
+"""
+Profiler - Opt-in sampling profiles of individual requests
+
+ProfilerMiddleware profiles a random PROFILE_SAMPLE_RATE share of requests,
+plus any request carrying a valid signed X-Debug-Profile token. While at
+least one request is being profiled, a background thread samples every
+PROFILE_INTERVAL_MS:
+
+- when the request's task is running, the stack of the event loop thread
+- otherwise the task's suspended coroutine chain, ending in "(awaiting)",
+  so time spent waiting on the database or OpenAI shows up too
+
+Nothing is traced per call, and no sampling happens while no request is
+being profiled. Each profile is written to PROFILE_DIR in the collapsed
+stack format that flamegraph.pl, speedscope and inferno read. Only the
+newest PROFILE_MAX_FILES files are kept. The response names its profile in
+X-Profile-Id; see admin.py for listing and downloading.
+
+Tokens are "<expiry>:<hmac>" signed with PROFILE_SECRET:
+
+    python profiler.py --ttl 3600
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+# Empty disables signed tokens and the admin endpoints
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+PROFILE_HEADER = "X-Debug-Profile"
+
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+PROFILE_SUFFIX = ".collapsed"
+
+PROFILE_NAME = re.compile(r"^[\w.-]+\.collapsed$")
+
+
+# -------------------------------
+# Signed tokens
+# -------------------------------
+def _signature(expiry: int) -> str:
+    return hmac.new(PROFILE_SECRET.encode(), str(expiry).encode(), hashlib.sha256).hexdigest()
+
+
+def sign_token(ttl_seconds: int = 3600) -> str:
+    expiry = int(time.time()) + ttl_seconds
+    return f"{expiry}:{_signature(expiry)}"
+
+
+def verify_token(token: Optional[str]) -> bool:
+    if not PROFILE_SECRET or not token:
+        return False
+    expiry, _, signature = token.partition(":")
+    if not expiry.isdigit() or int(expiry) < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(int(expiry)))
+
+
+# -------------------------------
+# Sampler
+# -------------------------------
+@dataclass
+class _Profile:
+    task: asyncio.Task
+    loop: asyncio.AbstractEventLoop
+    thread_id: int
+    stacks: dict = field(default_factory=dict)
+    samples: int = 0
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno or 0})"
+
+
+def _thread_stack(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def _awaiting_stack(task: asyncio.Task) -> str:
+    # Outermost coroutine first, down to the innermost await
+    return ";".join([_frame_label(f) for f in task.get_stack()] + ["(awaiting)"])
+
+
+class _Sampler:
+    """One thread per process, sleeping while no request is being profiled"""
+
+    def __init__(self):
+        self._profiles = {}
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, profile: _Profile) -> None:
+        self._profiles[id(profile)] = profile
+        self._wake.set()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self, profile: _Profile) -> None:
+        self._profiles.pop(id(profile), None)
+        if not self._profiles:
+            self._wake.clear()
+
+    def _run(self) -> None:
+        interval = PROFILE_INTERVAL_MS / 1000
+        while True:
+            self._wake.wait()
+            time.sleep(interval)
+            frames = sys._current_frames()
+            for profile in list(self._profiles.values()):
+                try:
+                    if asyncio.current_task(profile.loop) is profile.task:
+                        stack = _thread_stack(frames.get(profile.thread_id))
+                    else:
+                        stack = _awaiting_stack(profile.task)
+                except RuntimeError:
+                    # The task moved on while its stack was being read
+                    continue
+                profile.stacks[stack] = profile.stacks.get(stack, 0) + 1
+                profile.samples += 1
+
+
+_sampler = _Sampler()
+
+
+# -------------------------------
+# Profile files
+# -------------------------------
+def _profile_name(method: str, path: str) -> str:
+    slug = re.sub(r"[^\w]+", "_", path).strip("_") or "root"
+    return f"{int(time.time() * 1000)}-{os.getpid()}-{method}-{slug[:60]}{PROFILE_SUFFIX}"
+
+
+def _write_profile(name: str, stacks: dict) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, name)
+    with open(path + ".tmp", "w") as f:
+        for stack, count in sorted(stacks.items()):
+            f.write(f"{stack} {count}\n")
+    os.replace(path + ".tmp", path)
+
+    # Names start with a millisecond timestamp, so sorting puts the oldest first
+    names = sorted(n for n in os.listdir(PROFILE_DIR) if n.endswith(PROFILE_SUFFIX))
+    for old in names[:max(len(names) - PROFILE_MAX_FILES, 0)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, old))
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles() -> list:
+    """Newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if PROFILE_NAME.match(name):
+            stat = os.stat(os.path.join(PROFILE_DIR, name))
+            profiles.append({"name": name, "bytes": stat.st_size, "modified": stat.st_mtime})
+    return profiles
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Path of a stored profile, or None for unknown or unsafe names"""
+    if not PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+# -------------------------------
+# ASGI middleware
+# -------------------------------
+def _header(scope, name: str) -> Optional[str]:
+    name = name.lower().encode()
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class ProfilerMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        name = _profile_name(scope["method"], scope["path"])
+        profile = _Profile(
+            task=asyncio.current_task(),
+            loop=asyncio.get_running_loop(),
+            thread_id=threading.get_ident()
+        )
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_ID_HEADER.lower().encode(), name.encode())
+                ]
+            await send(message)
+
+        _sampler.start(profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _sampler.stop(profile)
+            if profile.samples:
+                # The response has been sent; the write only delays this task
+                await asyncio.get_running_loop().run_in_executor(
+                    None, _write_profile, name, dict(profile.stacks)
+                )
+
+    @staticmethod
+    def _wanted(scope) -> bool:
+        if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            return True
+        return PROFILE_SECRET != "" and verify_token(_header(scope, PROFILE_HEADER))
+
+
+if __name__ == "__main__":
+    # Token command: python profiler.py [--ttl SECONDS]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print a signed X-Debug-Profile token")
+    parser.add_argument("--ttl", type=int, default=3600, help="seconds the token stays valid")
+    args = parser.parse_args()
+
+    if not PROFILE_SECRET:
+        sys.exit("PROFILE_SECRET is not set")
+    print(sign_token(args.ttl))
@@ -0,0 +1,178 @@
+"""
+Query Stats - Per-request SQL accounting
+
+Engine events time every statement and charge it to the request being
+served, tracked in a context variable that follows the request into
+run_sync greenlets and threadpool calls. QueryStatsMiddleware reports the
+totals:
+
+- as X-DB-Query-Count / X-DB-Time-Ms / X-DB-Slowest-Ms response headers
+  when QUERY_DEBUG_HEADERS=1
+- as a warning on the "query_stats" logger when a request takes longer
+  than SLOW_REQUEST_MS or runs more than SLOW_REQUEST_QUERIES statements
+- to record_requests() / assert_query_budget() for tests and benchmarks
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event
+
+
+QUERY_DEBUG_HEADERS = os.getenv("QUERY_DEBUG_HEADERS", "0") == "1"
+
+# 0 disables either threshold
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+
+SLOW_REQUEST_QUERIES = int(os.getenv("SLOW_REQUEST_QUERIES", "20"))
+
+QUERY_COUNT_HEADER = "X-DB-Query-Count"
+
+QUERY_TIME_HEADER = "X-DB-Time-Ms"
+
+SLOWEST_QUERY_HEADER = "X-DB-Slowest-Ms"
+
+QUERY_STATS_HEADERS = [QUERY_COUNT_HEADER, QUERY_TIME_HEADER, SLOWEST_QUERY_HEADER]
+
+logger = logging.getLogger("query_stats")
+
+
+@dataclass
+class RequestStats:
+    method: str
+    path: str
+    status: int = 0
+    duration: float = 0.0
+    queries: int = 0
+    db_time: float = 0.0
+    slowest_time: float = 0.0
+    slowest_statement: Optional[str] = None
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.queries += 1
+        self.db_time += elapsed
+        if elapsed >= self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("query_stats_request", default=None)
+
+# Lists filled by record_requests(); module level so they see requests served
+# on other threads, e.g. by TestClient
+_recorders: list = []
+
+
+# -------------------------------
+# Engine hooks
+# -------------------------------
+# The start time lives on the statement's execution context, which is dropped
+# with the statement, so a statement that raises leaves nothing behind
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_stats_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_stats_started", None)
+    stats = _current.get()
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def instrument_engine(engine) -> None:
+    """Charge statements run through ``engine`` (a sync Engine) to the current request"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# -------------------------------
+# ASGI middleware
+# -------------------------------
+class QueryStatsMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(method=scope["method"], path=scope["path"])
+        token = _current.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                stats.status = message["status"]
+                if QUERY_DEBUG_HEADERS:
+                    # Work done while streaming the body is not included
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (QUERY_COUNT_HEADER.lower().encode(), str(stats.queries).encode()),
+                        (QUERY_TIME_HEADER.lower().encode(), f"{stats.db_time * 1000:.1f}".encode()),
+                        (SLOWEST_QUERY_HEADER.lower().encode(), f"{stats.slowest_time * 1000:.1f}".encode()),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            stats.duration = time.perf_counter() - started
+            _current.reset(token)
+            _finish(stats)
+
+
+def _finish(stats: RequestStats) -> None:
+    for recorder in _recorders:
+        recorder.append(stats)
+
+    too_slow = SLOW_REQUEST_MS and stats.duration * 1000 > SLOW_REQUEST_MS
+    too_many = SLOW_REQUEST_QUERIES and stats.queries > SLOW_REQUEST_QUERIES
+    if too_slow or too_many:
+        logger.warning(
+            "Slow request %s %s -> %s: %.1f ms, %d queries, %.1f ms in the database; "
+            "slowest query %.1f ms: %s",
+            stats.method, stats.path, stats.status, stats.duration * 1000, stats.queries,
+            stats.db_time * 1000, stats.slowest_time * 1000,
+            " ".join((stats.slowest_statement or "-").split())
+        )
+
+
+# -------------------------------
+# Tests and benchmarks
+# -------------------------------
+@contextmanager
+def record_requests():
+    """Collect the RequestStats of every request finished inside the block"""
+    recorded = []
+    _recorders.append(recorded)
+    try:
+        yield recorded
+    finally:
+        _recorders.remove(recorded)
+
+
+@contextmanager
+def assert_query_budget(max_queries: int):
+    """Fail if any request served inside the block runs more than ``max_queries``
+    statements, e.g. in a pytest test:
+
+        with assert_query_budget(3):
+            client.get("/dashboard/overview", headers=headers)
+    """
+    with record_requests() as recorded:
+        yield recorded
+
+    assert recorded, "No requests were served inside assert_query_budget"
+    over = [s for s in recorded if s.queries > max_queries]
+    assert not over, "Query budget of {} exceeded:\n{}".format(max_queries, "\n".join(
+        f"  {s.method} {s.path}: {s.queries} queries, slowest {s.slowest_time * 1000:.1f} ms: "
+        f"{' '.join((s.slowest_statement or '-').split())}"
+        for s in over
+    ))
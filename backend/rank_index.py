@@ -0,0 +1,281 @@
+"""
+Rank Index - In-memory order statistics over user XP for the leaderboard
+
+Users are kept sorted by (-xp, user_id) in fixed-size sorted buckets, with a
+Fenwick tree over the bucket sizes. Rank, top-K and neighbourhood lookups are
+O(log n) plus the size of the answer.
+
+Each worker process keeps its own index and only sees its own writes, so a
+background thread rebuilds it from the users table every
+RANK_INDEX_TTL_SECONDS and swaps it in. The database does the sorting, and
+requests keep reading the old index until the swap.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import User
+
+
+BUCKET_SIZE = 1000
+
+# Writes made by other worker processes show up after at most this long
+RANK_INDEX_TTL_SECONDS = float(os.getenv("RANK_INDEX_TTL_SECONDS", "30"))
+
+RELOAD_CHUNK_ROWS = 10000
+
+logger = logging.getLogger("rank_index")
+
+
+def _fenwick(buckets: list) -> list:
+    n = len(buckets)
+    tree = [0] * (n + 1)
+    for i, bucket in enumerate(buckets, start=1):
+        tree[i] += len(bucket)
+        parent = i + (i & -i)
+        if parent <= n:
+            tree[parent] += tree[i]
+    return tree
+
+
+class RankIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = []   # sorted lists of (-xp, user_id)
+        self._maxes = []     # last key of each bucket
+        self._tree = []      # Fenwick tree over bucket sizes (1-based)
+        self._xp = {}        # user_id -> xp currently indexed
+        self._reloading = threading.Lock()
+        self._pending = None  # writes made while a reload reads, replayed on swap
+
+    # ---- Fenwick tree over bucket sizes ----
+    def _rebuild_tree(self):
+        self._tree = _fenwick(self._buckets)
+
+    def _tree_add(self, bucket: int, delta: int):
+        i = bucket + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, bucket: int) -> int:
+        """Number of users in buckets before ``bucket``"""
+        total, i = 0, bucket
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _find_bucket(self, position: int):
+        """Bucket holding the 0-based ``position`` and the offset inside it"""
+        bucket, remaining = 0, position
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            nxt = bucket + step
+            if nxt < len(self._tree) and self._tree[nxt] <= remaining:
+                bucket = nxt
+                remaining -= self._tree[nxt]
+            step >>= 1
+        return bucket, remaining
+
+    # ---- sorted buckets ----
+    def _insert(self, key):
+        if not self._buckets:
+            self._buckets, self._maxes = [[key]], [key]
+            self._rebuild_tree()
+            return
+
+        i = min(bisect_left(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[i]
+        insort(bucket, key)
+        self._maxes[i] = bucket[-1]
+
+        if len(bucket) > 2 * BUCKET_SIZE:
+            self._buckets[i:i + 1] = [bucket[:BUCKET_SIZE], bucket[BUCKET_SIZE:]]
+            self._maxes[i:i + 1] = [bucket[BUCKET_SIZE - 1], bucket[-1]]
+            self._rebuild_tree()
+        else:
+            self._tree_add(i, 1)
+
+    def _remove(self, key):
+        i = bisect_left(self._maxes, key)
+        bucket = self._buckets[i]
+        del bucket[bisect_left(bucket, key)]
+
+        if bucket:
+            self._maxes[i] = bucket[-1]
+            self._tree_add(i, -1)
+        else:
+            del self._buckets[i]
+            del self._maxes[i]
+            self._rebuild_tree()
+
+    def _set(self, user_id: int, xp: int):
+        old = self._xp.get(user_id)
+        if old == xp:
+            return
+        if old is not None:
+            self._remove((-old, user_id))
+        self._insert((-xp, user_id))
+        self._xp[user_id] = xp
+
+    def _drop(self, user_id: int):
+        old = self._xp.pop(user_id, None)
+        if old is not None:
+            self._remove((-old, user_id))
+
+    def _swap(self, buckets: list, xp: dict):
+        """Install a new index, then replay writes it may have missed (lock held)"""
+        self._buckets = buckets
+        self._maxes = [bucket[-1] for bucket in buckets]
+        self._xp = xp
+        self._rebuild_tree()
+        for user_id, new_xp in self._pending or ():
+            if new_xp is None:
+                self._drop(user_id)
+            else:
+                self._set(user_id, new_xp)
+        self._pending = None
+
+    # ---- public API ----
+    def load(self, users) -> None:
+        """Replace the index with ``(user_id, xp)`` pairs"""
+        keys = sorted((-(xp or 0), user_id) for user_id, xp in users)
+        buckets = [keys[i:i + BUCKET_SIZE] for i in range(0, len(keys), BUCKET_SIZE)]
+        with self._lock:
+            self._swap(buckets, {user_id: -neg_xp for neg_xp, user_id in keys})
+
+    def reload(self, ordered_users) -> None:
+        """Rebuild from ``ordered_users()``: ``(user_id, xp)`` pairs already
+        ordered by xp descending, then user id.
+
+        Runs off the event loop. The new index is built without holding the
+        lock and swapped in at the end; updates made meanwhile are replayed
+        on top of it.
+        """
+        with self._reloading:
+            with self._lock:
+                self._pending = []
+            try:
+                buckets, xp, bucket = [], {}, []
+                for user_id, user_xp in ordered_users():
+                    bucket.append((-user_xp, user_id))
+                    xp[user_id] = user_xp
+                    if len(bucket) == BUCKET_SIZE:
+                        buckets.append(bucket)
+                        bucket = []
+                if bucket:
+                    buckets.append(bucket)
+            except BaseException:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                self._swap(buckets, xp)
+
+    def update(self, user_id: int, xp: int) -> None:
+        xp = xp or 0
+        with self._lock:
+            self._set(user_id, xp)
+            if self._pending is not None:
+                self._pending.append((user_id, xp))
+
+    def remove(self, user_id: int) -> None:
+        with self._lock:
+            self._drop(user_id)
+            if self._pending is not None:
+                self._pending.append((user_id, None))
+
+    def xp(self, user_id: int) -> Optional[int]:
+        """XP a user is currently ranked with, or None if not indexed"""
+        return self._xp.get(user_id)
+
+    def __len__(self) -> int:
+        return len(self._xp)
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based rank of a user, or None if the user is not indexed"""
+        with self._lock:
+            xp = self._xp.get(user_id)
+            if xp is None:
+                return None
+            key = (-xp, user_id)
+            i = bisect_left(self._maxes, key)
+            return self._prefix(i) + bisect_left(self._buckets[i], key) + 1
+
+    def range(self, first_rank: int, count: int) -> list:
+        """``(rank, user_id, xp)`` for ``count`` users starting at ``first_rank``"""
+        with self._lock:
+            start = max(first_rank, 1) - 1
+            stop = min(start + count, len(self._xp))
+            if start >= stop:
+                return []
+
+            result = []
+            bucket, offset = self._find_bucket(start)
+            rank = start + 1
+            while rank <= stop:
+                neg_xp, user_id = self._buckets[bucket][offset]
+                result.append((rank, user_id, -neg_xp))
+                rank += 1
+                offset += 1
+                if offset == len(self._buckets[bucket]):
+                    bucket, offset = bucket + 1, 0
+            return result
+
+    def top(self, k: int) -> list:
+        return self.range(1, k)
+
+    def around(self, rank: int, radius: int) -> list:
+        """Users within ``radius`` places of ``rank``"""
+        first = max(rank - radius, 1)
+        return self.range(first, rank + radius - first + 1)
+
+
+rank_index = RankIndex()
+
+
+def _ordered_users(db: Session):
+    # Sorted by the database, so the reload thread never holds the GIL for a sort
+    xp = func.coalesce(User.xp_points, 0)
+    return db.execute(
+        select(User.id, xp).order_by(xp.desc(), User.id).execution_options(yield_per=RELOAD_CHUNK_ROWS)
+    )
+
+
+def load_rank_index(db: Session) -> None:
+    rank_index.reload(lambda: _ordered_users(db))
+
+
+def refresh_rank_index() -> None:
+    """Rebuild the index from the users table in a session of its own"""
+    with SessionLocal() as db:
+        load_rank_index(db)
+
+
+_refresher: Optional[threading.Thread] = None
+
+
+def start_refresher() -> None:
+    """Reload the index every RANK_INDEX_TTL_SECONDS in a background thread"""
+    global _refresher
+    if _refresher is not None or RANK_INDEX_TTL_SECONDS <= 0:
+        return
+
+    def run():
+        while True:
+            time.sleep(RANK_INDEX_TTL_SECONDS)
+            try:
+                refresh_rank_index()
+            except Exception:
+                logger.exception("Could not reload the rank index")
+
+    _refresher = threading.Thread(target=run, name="rank-index-refresh", daemon=True)
+    _refresher.start()
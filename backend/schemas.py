@@ -1,5 +1,5 @@
 from datetime import datetime, date
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 
 
@@ -72,6 +72,23 @@ class TaskResponse(BaseModel):
         from_attributes = True
 
 
+# Upper bound on items per POST /tasks/complete-batch and /tasks/{skill_id}/bulk
+MAX_BATCH_TASKS = 500
+
+
+class TaskBatchComplete(BaseModel):
+    task_ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_TASKS)
+
+
+class TaskBulkCreate(BaseModel):
+    tasks: List[TaskCreate] = Field(..., min_length=1, max_length=MAX_BATCH_TASKS)
+
+
+class TaskBulkCreateResponse(BaseModel):
+    created: int
+    task_ids: List[int]
+
+
 # Milestone Schemas
 class MilestoneCreate(BaseModel):
     title: str
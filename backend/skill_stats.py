@@ -0,0 +1,135 @@
+"""
+Skill Stats Service - Per-skill task counters shared by dashboard endpoints
+"""
+from sqlalchemy import func, case, select, update, bindparam
+from sqlalchemy.orm import Session
+from models import Skill, Task, User
+from data_version import NEXT_DATA_VERSION
+
+
+def get_skill_task_counts(db: Session, user: User, *criteria) -> list:
+    """Total/completed/pending task counts for every skill of a user.
+
+    Reads the denormalized counters on Skill, so this is a single query on
+    skills no matter how many skills or tasks the user has. Extra SQLAlchemy
+    criteria on Skill (e.g. ``Skill.goal_date != None``) narrow the result.
+    """
+    skills = db.query(Skill).filter(
+        Skill.user_id == user.id,
+        *criteria
+    ).order_by(Skill.id).all()
+
+    return [
+        {
+            "skill": skill,
+            "total": skill.task_count or 0,
+            "completed": skill.completed_count or 0,
+            "pending": (skill.task_count or 0) - (skill.completed_count or 0),
+            "pending_minutes": skill.pending_minutes or 0
+        }
+        for skill in skills
+    ]
+
+
+def get_progress_percent(stats: dict) -> float:
+    """Completion percentage (0-100) for one entry of get_skill_task_counts"""
+    if stats["total"] == 0:
+        return 0
+    return stats["completed"] / stats["total"] * 100
+
+
+def apply_task_counter_delta(db: Session, user_id: int, skill_id: int, tasks: int = 0,
+                             completed: int = 0, pending_minutes: int = 0) -> None:
+    """Adjust the task counters on a skill and its owner.
+
+    Uses in-place SQL increments and does not commit, so the change lands in
+    the same transaction as the task write that caused it. Also bumps the
+    owner's data version.
+    """
+    for model, criteria, extra in (
+        (Skill, (Skill.id == skill_id, Skill.user_id == user_id), {}),
+        (User, (User.id == user_id,), {"data_version": NEXT_DATA_VERSION})
+    ):
+        db.execute(
+            update(model).where(*criteria).values(
+                task_count=func.coalesce(model.task_count, 0) + tasks,
+                completed_count=func.coalesce(model.completed_count, 0) + completed,
+                pending_minutes=func.coalesce(model.pending_minutes, 0) + pending_minutes,
+                **extra
+            ).execution_options(synchronize_session=False)
+        )
+
+
+def apply_task_counter_deltas(db: Session, user_id: int, deltas: dict) -> None:
+    """Batch form of apply_task_counter_delta.
+
+    ``deltas`` maps skill_id -> (tasks, completed, pending_minutes). Skills are
+    updated in one executemany and the user's totals in one UPDATE.
+    """
+    if not deltas:
+        return
+
+    skills = Skill.__table__
+    db.execute(
+        update(skills).where(
+            skills.c.id == bindparam("skill_id"),
+            skills.c.user_id == user_id
+        ).values(
+            task_count=func.coalesce(skills.c.task_count, 0) + bindparam("tasks"),
+            completed_count=func.coalesce(skills.c.completed_count, 0) + bindparam("completed"),
+            pending_minutes=func.coalesce(skills.c.pending_minutes, 0) + bindparam("minutes")
+        ),
+        [
+            {"skill_id": skill_id, "tasks": tasks, "completed": completed, "minutes": minutes}
+            for skill_id, (tasks, completed, minutes) in deltas.items()
+        ]
+    )
+
+    db.execute(
+        update(User).where(User.id == user_id).values(
+            task_count=func.coalesce(User.task_count, 0) + sum(d[0] for d in deltas.values()),
+            completed_count=func.coalesce(User.completed_count, 0) + sum(d[1] for d in deltas.values()),
+            pending_minutes=func.coalesce(User.pending_minutes, 0) + sum(d[2] for d in deltas.values()),
+            data_version=NEXT_DATA_VERSION
+        ).execution_options(synchronize_session=False)
+    )
+
+
+def recompute_task_counters(db: Session) -> None:
+    """Rebuild every skill and user counter from the Task table in bulk.
+
+    Bumps every user's data version, so cached dashboards are not served
+    with the old counters.
+    """
+    pending_minutes = func.coalesce(func.sum(
+        case((Task.is_completed == True, 0), else_=func.coalesce(Task.estimated_minutes, 0))
+    ), 0)
+    completed = func.coalesce(func.sum(case((Task.is_completed == True, 1), else_=0)), 0)
+
+    def counters(*criteria):
+        return {
+            "task_count": select(func.count(Task.id)).where(*criteria).scalar_subquery(),
+            "completed_count": select(completed).where(*criteria).scalar_subquery(),
+            "pending_minutes": select(pending_minutes).where(*criteria).scalar_subquery()
+        }
+
+    db.execute(update(Skill).values(
+        **counters(Task.skill_id == Skill.id, Task.user_id == Skill.user_id)
+    ).execution_options(synchronize_session=False))
+    db.execute(update(User).values(
+        **counters(Task.user_id == User.id),
+        data_version=NEXT_DATA_VERSION
+    ).execution_options(synchronize_session=False))
+    db.commit()
+
+
+if __name__ == "__main__":
+    # Repair command: python skill_stats.py
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        recompute_task_counters(db)
+        print("Task counters rebuilt")
+    finally:
+        db.close()
@@ -1,20 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import and_, not_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from datetime import datetime, timezone
 
-from database import get_db
+from database import get_async_db
 from models import Skill, User, Task
 from schemas import SkillCreate, SkillResponse
 from auth_dependencies import get_current_user
+from skill_stats import apply_task_counter_delta
+from plan_cache import invalidate_user_plans
+from trends import remove_created_tasks
+from data_version import bump_data_version, check_etag
+from pagination import PageParams, paginate, finish_page
+from fast_json import trusted_response
 
 router = APIRouter(prefix="/skills", tags=["skills"])
 
 
 @router.post("/", response_model=SkillResponse)
-def create_skill(
+async def create_skill(
     skill: SkillCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     new_skill = Skill(
@@ -32,46 +39,63 @@ def create_skill(
     )
 
     db.add(new_skill)
-    db.commit()
-    db.refresh(new_skill)
+    await db.run_sync(invalidate_user_plans, current_user.id)
+    await db.run_sync(bump_data_version, current_user.id)
+    await db.commit()
+    await db.refresh(new_skill)
     return new_skill
 
 
-@router.get("/", response_model=List[SkillResponse])
-def read_skills(
+@router.get("/", response_model=List[SkillResponse], dependencies=[Depends(check_etag)])
+async def read_skills(
 
-    db:Session=Depends(get_db),
+    response: Response,
+
+    completed: Optional[bool] = None,
+
+    page: PageParams = Depends(),
+
+    db:AsyncSession=Depends(get_async_db),
 
     current_user:User = Depends(get_current_user)
 ):
-    
+    stmt = select(Skill).where(Skill.user_id == current_user.id)
 
+    if completed is not None:
 
-    return db.query(Skill).filter(Skill.user_id == current_user.id).all()
+        # A skill is complete once it has tasks and all of them are done
+        done = and_(Skill.task_count > 0, Skill.completed_count == Skill.task_count)
+
+        stmt = stmt.where(done if completed else not_(done))
+
+    rows = (await db.execute(paginate(stmt, Skill, page))).scalars().all()
+
+    # Rows come straight from the database, so the response_model pass is skipped
+    return trusted_response(SkillResponse, finish_page(rows, page, response), response)
 
 
 
 @router.put("/{skill_id}",response_model=SkillResponse)
 
-def update_skill(
+async def update_skill(
 
     skill_id: int,
 
     skill: SkillCreate,
 
-    db:Session=Depends(get_db),
+    db:AsyncSession=Depends(get_async_db),
 
     current_user : User = Depends(get_current_user)
 ):
     
 
 
-    db_skill = db.query(Skill).filter(
+    db_skill = (await db.execute(select(Skill).where(
 
         Skill.id == skill_id,
 
         Skill.user_id == current_user.id
-    ).first()
+    ))).scalars().first()
 
 
     if not db_skill:
@@ -84,10 +108,13 @@ def update_skill(
         setattr(db_skill,k,v)
 
 
+    await db.run_sync(invalidate_user_plans, current_user.id)
+
+    await db.run_sync(bump_data_version, current_user.id)
 
-    db.commit()
+    await db.commit()
 
-    db.refresh(db_skill)
+    await db.refresh(db_skill)
 
     return db_skill
     
@@ -96,22 +123,22 @@ def update_skill(
 
 @router.delete("/{skill_id}")
 
-def delete_skill(
+async def delete_skill(
 
     skill_id: int,
 
-    db:Session =Depends(get_db),
+    db:AsyncSession =Depends(get_async_db),
 
     current_user:User = Depends(get_current_user)
 ):
     
 
-    db_skill = db.query(Skill).filter(
+    db_skill = (await db.execute(select(Skill).where(
 
         Skill.id == skill_id,
 
         Skill.user_id == current_user.id
-    ).first()
+    ))).scalars().first()
 
 
     if not db_skill:
@@ -120,9 +147,25 @@ def delete_skill(
             raise HTTPException(status_code=404,detail="Skill not found")
         
 
-    db.delete(db_skill)
+    await db.run_sync(
+
+        apply_task_counter_delta, current_user.id, db_skill.id,
+
+        tasks=-(db_skill.task_count or 0),
+
+        completed=-(db_skill.completed_count or 0),
+
+        pending_minutes=-(db_skill.pending_minutes or 0)
+    )
+
+    # The deleted tasks no longer count as created, as after a backfill
+    await db.run_sync(remove_created_tasks, Task.skill_id == db_skill.id)
+
+    await db.delete(db_skill)
+
+    await db.run_sync(invalidate_user_plans, current_user.id)
 
-    db.commit()
+    await db.commit()
 
 
     return {"message":"Skill deleted"}
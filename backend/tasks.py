@@ -1,21 +1,119 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone
+from typing import Optional
 
-from database import get_db
-from models import Task, User
-from schemas import TaskCreate, TaskResponse
+from database import get_async_db
+from models import Skill, Task, User
+from schemas import (
+    TaskCreate, TaskResponse, TaskBatchComplete,
+    TaskBulkCreate, TaskBulkCreateResponse
+)
 from auth_dependencies import get_current_user
 from gamification import award_xp, update_streak, log_daily_activity
+from skill_stats import apply_task_counter_delta, apply_task_counter_deltas
+from plan_cache import invalidate_user_plans
+from rank_index import rank_index
+from data_version import check_etag
+from pagination import PageParams, paginate, finish_page
+from fast_json import trusted_response
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
 
 
+# Declared before POST /{skill_id} so "complete-batch" is not parsed as a skill id
+@router.post("/complete-batch")
+async def complete_tasks_batch(
+    batch: TaskBatchComplete,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    task_ids = list(dict.fromkeys(batch.task_ids))
+
+    # Ownership check for every id in one query
+    owned = {
+        t.id: t for t in (await db.execute(select(Task).where(
+            Task.id.in_(task_ids),
+            Task.user_id == current_user.id
+        ))).scalars()
+    }
+
+    # Mark all open tasks complete in one UPDATE; the guard skips concurrent winners
+    open_ids = [i for i in task_ids if i in owned and not owned[i].is_completed]
+    claimed = set()
+    if open_ids:
+        claimed = set((await db.execute(
+            update(Task).where(
+                Task.id.in_(open_ids),
+                Task.is_completed == False
+            ).values(
+                is_completed=True,
+                completed_at=datetime.now(timezone.utc)
+            ).returning(Task.id).execution_options(synchronize_session=False)
+        )).scalars().all())
+
+    results = []
+    deltas = {}
+    xp_total = minutes_total = 0
+    for task_id in task_ids:
+        task = owned.get(task_id)
+        if task is None:
+            results.append({"task_id": task_id, "status": "not_found", "xp_earned": 0})
+            continue
+        if task_id not in claimed:
+            results.append({"task_id": task_id, "status": "already_completed", "xp_earned": 0})
+            continue
+
+        minutes = task.estimated_minutes or 0
+        _, completed, pending_minutes = deltas.get(task.skill_id, (0, 0, 0))
+        deltas[task.skill_id] = (0, completed + 1, pending_minutes - minutes)
+        xp_total += task.xp_reward or 0
+        minutes_total += minutes
+        results.append({"task_id": task_id, "status": "completed", "xp_earned": task.xp_reward or 0})
+
+    if not claimed:
+        return {
+            "results": results,
+            "completed": 0,
+            "xp_earned": 0,
+            "total_xp": current_user.xp_points,
+            "level": current_user.level,
+            "level_up": False,
+            "current_streak": current_user.current_streak
+        }
+
+    # One write each for counters, XP, streak and activity, committed together
+    await db.run_sync(apply_task_counter_deltas, current_user.id, deltas)
+    await db.run_sync(invalidate_user_plans, current_user.id)
+    xp_result = await db.run_sync(award_xp, current_user, xp_total)
+    streak_result = await db.run_sync(update_streak, current_user)
+    await db.run_sync(
+        log_daily_activity, current_user,
+        tasks_completed=len(claimed),
+        minutes_spent=minutes_total,
+        xp_earned=xp_total
+    )
+
+    await db.commit()
+    rank_index.update(current_user.id, xp_result["total_xp"])
+
+    return {
+        "results": results,
+        "completed": len(claimed),
+        "xp_earned": xp_total,
+        "total_xp": xp_result["total_xp"],
+        "level": xp_result["level"],
+        "level_up": xp_result["level_up"],
+        "current_streak": streak_result["current_streak"]
+    }
+
+
 @router.post("/{skill_id}", response_model=TaskResponse)
-def create_task(
+async def create_task(
     skill_id: int,
     task: TaskCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     new_task = Task(
@@ -27,33 +125,93 @@ def create_task(
     )
 
     db.add(new_task)
-    db.commit()
-    db.refresh(new_task)
+    await db.run_sync(
+        apply_task_counter_delta, current_user.id, skill_id,
+        tasks=1,
+        pending_minutes=new_task.estimated_minutes or 0
+    )
+    await db.run_sync(log_daily_activity, current_user, tasks_created=1)
+    await db.run_sync(invalidate_user_plans, current_user.id)
+    await db.commit()
+    await db.refresh(new_task)
     return new_task
 
 
-@router.get("/{skill_id}", response_model=list[TaskResponse])
-def get_tasks(
+@router.post("/{skill_id}/bulk", response_model=TaskBulkCreateResponse)
+async def create_tasks_bulk(
+    skill_id: int,
+    batch: TaskBulkCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    owns_skill = (await db.execute(select(Skill.id).where(
+        Skill.id == skill_id,
+        Skill.user_id == current_user.id
+    ))).first()
+    if not owns_skill:
+        raise HTTPException(status_code=404, detail="Skill not found")
+
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "title": task.title,
+            "description": task.description,
+            "skill_id": skill_id,
+            "user_id": current_user.id,
+            "is_completed": False,
+            "xp_reward": task.xp_reward if task.xp_reward is not None else 10,
+            "estimated_minutes": task.estimated_minutes if task.estimated_minutes is not None else 30,
+            "created_at": now
+        }
+        for task in batch.tasks
+    ]
+
+    # One multi-row INSERT ... RETURNING instead of an insert + refresh per task
+    task_ids = list((await db.execute(insert(Task).returning(Task.id), rows)).scalars())
+
+    await db.run_sync(
+        apply_task_counter_delta, current_user.id, skill_id,
+        tasks=len(rows),
+        pending_minutes=sum(row["estimated_minutes"] for row in rows)
+    )
+    await db.run_sync(log_daily_activity, current_user, tasks_created=len(rows))
+    await db.run_sync(invalidate_user_plans, current_user.id)
+    await db.commit()
+
+    return {"created": len(task_ids), "task_ids": task_ids}
+
+
+@router.get("/{skill_id}", response_model=list[TaskResponse], dependencies=[Depends(check_etag)])
+async def get_tasks(
     skill_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    completed: Optional[bool] = None,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    return db.query(Task).filter(
+    stmt = select(Task).where(
         Task.skill_id == skill_id,
         Task.user_id == current_user.id
-    ).all()
+    )
+    if completed is not None:
+        stmt = stmt.where(Task.is_completed == completed)
+
+    rows = (await db.execute(paginate(stmt, Task, page))).scalars().all()
+    # Rows come straight from the database, so the response_model pass is skipped
+    return trusted_response(TaskResponse, finish_page(rows, page, response), response)
 
 
 @router.put("/{task_id}/complete")
-def complete_task(
+async def complete_task(
     task_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_task = db.query(Task).filter(
+    db_task = (await db.execute(select(Task).where(
         Task.id == task_id,
         Task.user_id == current_user.id
-    ).first()
+    ))).scalars().first()
 
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -61,25 +219,45 @@ def complete_task(
     if db_task.is_completed:
         return {"message": "Task already completed"}
 
-    # Mark as completed
-    db_task.is_completed = True
-    db_task.completed_at = datetime.now(timezone.utc)
-    db.commit()
+    # Mark as completed; the guard makes concurrent completions award XP once
+    claimed = (await db.execute(
+        update(Task).where(
+            Task.id == db_task.id,
+            Task.is_completed == False
+        ).values(
+            is_completed=True,
+            completed_at=datetime.now(timezone.utc)
+        ).execution_options(synchronize_session=False)
+    )).rowcount
+
+    if not claimed:
+        return {"message": "Task already completed"}
+
+    # Every side effect below lands in one transaction
+    await db.run_sync(
+        apply_task_counter_delta, current_user.id, db_task.skill_id,
+        completed=1,
+        pending_minutes=-(db_task.estimated_minutes or 0)
+    )
+    await db.run_sync(invalidate_user_plans, current_user.id)
 
     # Award XP
-    xp_result = award_xp(db, current_user, db_task.xp_reward)
+    xp_result = await db.run_sync(award_xp, current_user, db_task.xp_reward)
     
     # Update streak
-    streak_result = update_streak(db, current_user)
+    streak_result = await db.run_sync(update_streak, current_user)
     
     # Log daily activity
-    log_daily_activity(
-        db, current_user,
+    await db.run_sync(
+        log_daily_activity, current_user,
         tasks_completed=1,
         minutes_spent=db_task.estimated_minutes,
         xp_earned=db_task.xp_reward
     )
 
+    await db.commit()
+    rank_index.update(current_user.id, xp_result["total_xp"])
+
     return {
         "message": "Task completed!",
         "xp_earned": xp_result["xp_earned"],
@@ -88,6 +266,3 @@ def complete_task(
         "level_up": xp_result["level_up"],
         "current_streak": streak_result["current_streak"]
     }
-
-    return {"message":"Task completed"}
-
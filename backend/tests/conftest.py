@@ -0,0 +1,60 @@
+"""
+Shared fixtures - the app on a throwaway SQLite database
+
+database.py binds its engines to DATABASE_URL at import, so the URL is set
+here, before any test imports the app.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(
+    tempfile.mkdtemp(prefix="skill-tracker-tests-"), "test.db"
+)
+# ai_service builds its clients at import; no test calls OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+
+@pytest.fixture
+def app():
+    from main import app
+    return app
+
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app) as client:
+        yield client
+
+
+def create_user(xp_points: int = 0) -> tuple:
+    """Insert a user directly (no bcrypt) and return (user_id, auth headers)"""
+    from auth_utils import create_access_token
+    from database import SessionLocal
+    from models import User
+    from rank_index import rank_index
+
+    email = f"{uuid.uuid4().hex}@example.com"
+    with SessionLocal() as db:
+        user = User(name="Test", email=email, hashed_password="-", xp_points=xp_points)
+        db.add(user)
+        db.commit()
+        user_id = user.id
+    rank_index.update(user_id, xp_points)
+
+    token = create_access_token({"sub": email, "uid": user_id})
+    return user_id, {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def make_user():
+    return create_user
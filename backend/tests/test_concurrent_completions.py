@@ -0,0 +1,65 @@
+"""
+Concurrent and duplicate task completions award everything exactly once
+
+Completions are sent concurrently through the ASGI app: every task is
+completed several times at once, both one by one and through overlapping
+batches, and the totals must match completing each task once.
+"""
+import asyncio
+
+import httpx
+from sqlalchemy import func
+
+from database import SessionLocal
+from models import DailyActivity, Skill, User
+
+TASKS = 30
+DUPLICATES = 3  # concurrent PUT /complete requests per task
+
+
+async def _complete_concurrently(app, headers: dict, task_ids: list) -> list:
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
+            singles = [
+                client.put(f"/tasks/{task_id}/complete")
+                for task_id in task_ids for _ in range(DUPLICATES)
+            ]
+            half = len(task_ids) // 2
+            batches = [
+                client.post("/tasks/complete-batch", json={"task_ids": task_ids[:half + 5]}),
+                client.post("/tasks/complete-batch", json={"task_ids": task_ids[half - 5:] * 2}),
+            ]
+            return await asyncio.gather(*singles, *batches)
+
+
+def test_duplicate_and_parallel_completions_count_once(app, client, make_user):
+    user_id, headers = make_user()
+    skill_id = client.post("/skills/", headers=headers, json={"name": "Skill"}).json()["id"]
+    tasks = [
+        {"title": f"Task {i}", "xp_reward": i + 1, "estimated_minutes": 2 * i + 1}
+        for i in range(TASKS)
+    ]
+    created = client.post(f"/tasks/{skill_id}/bulk", headers=headers, json={"tasks": tasks})
+    assert created.status_code == 200
+    task_ids = created.json()["task_ids"]
+
+    responses = asyncio.run(_complete_concurrently(app, headers, task_ids))
+    assert [r.status_code for r in responses] == [200] * len(responses)
+
+    expected_xp = sum(task["xp_reward"] for task in tasks)
+    expected_minutes = sum(task["estimated_minutes"] for task in tasks)
+    with SessionLocal() as db:
+        user = db.get(User, user_id)
+        skill = db.get(Skill, skill_id)
+        completed, minutes, xp, created_count = db.query(
+            func.sum(DailyActivity.tasks_completed),
+            func.sum(DailyActivity.minutes_spent),
+            func.sum(DailyActivity.xp_earned),
+            func.sum(DailyActivity.tasks_created),
+        ).filter(DailyActivity.user_id == user_id).one()
+
+    assert user.xp_points == expected_xp
+    assert user.completed_count == TASKS
+    assert skill.completed_count == TASKS
+    assert (completed, minutes, xp, created_count) == (TASKS, expected_minutes, expected_xp, TASKS)
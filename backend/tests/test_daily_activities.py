@@ -0,0 +1,29 @@
+"""
+Batched daily activity deltas add up, including repeats of the same day
+"""
+from datetime import date
+
+from database import SessionLocal
+from gamification import log_daily_activities
+from models import DailyActivity
+
+
+def test_repeated_user_and_day_are_summed(make_user):
+    user_id, _headers = make_user()
+    day, other_day = date(2024, 1, 1), date(2024, 1, 2)
+
+    with SessionLocal() as db:
+        log_daily_activities(db, [
+            (user_id, day, 1, 10, 5, 0),
+            (user_id, other_day, 1, 1, 1, 1),
+            (user_id, day, 2, None, 7, 3),
+        ])
+        log_daily_activities(db, [(user_id, day, 1, 1, 1, 1)])
+        db.commit()
+
+        rows = {
+            row.date: (row.tasks_completed, row.minutes_spent, row.xp_earned, row.tasks_created)
+            for row in db.query(DailyActivity).filter(DailyActivity.user_id == user_id)
+        }
+
+    assert rows == {day: (4, 11, 13, 4), other_day: (1, 1, 1, 1)}
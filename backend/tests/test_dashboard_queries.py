@@ -0,0 +1,38 @@
+"""
+Dashboard reads run a fixed number of statements however many skills a user has
+"""
+import pytest
+
+from query_stats import assert_query_budget
+
+# get_current_user loads the user, then one read of skills
+QUERY_BUDGET = 2
+
+ENDPOINTS = ["/dashboard/overview", "/dashboard/weak-areas", "/dashboard/skills-progress"]
+
+
+def _add_skills(client, headers: dict, count: int) -> None:
+    for i in range(count):
+        skill_id = client.post("/skills/", headers=headers, json={"name": f"Skill {i}"}).json()["id"]
+        for j in range(3):
+            task_id = client.post(f"/tasks/{skill_id}", headers=headers, json={"title": f"Task {j}"}).json()["id"]
+            if j == 0:
+                client.put(f"/tasks/{task_id}/complete", headers=headers)
+
+
+def _queries(client, headers: dict, path: str) -> int:
+    with assert_query_budget(QUERY_BUDGET) as recorded:
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    return recorded[0].queries
+
+
+@pytest.mark.parametrize("path", ENDPOINTS)
+def test_query_count_does_not_grow_with_skills(client, make_user, path):
+    counts = []
+    for skills in (1, 25):
+        _user_id, headers = make_user()
+        _add_skills(client, headers, skills)
+        counts.append(_queries(client, headers, path))
+
+    assert counts[0] == counts[1]
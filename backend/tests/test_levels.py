@@ -0,0 +1,52 @@
+"""
+The level lookup table and closed form agree with the original level loop
+"""
+import random
+
+import pytest
+
+from gamification import LEVEL_TABLE_MAX, get_level_from_xp, get_levels_from_xp, get_xp_for_level
+
+SAMPLES = 200
+
+# Past the lookup table, levels come from the closed form
+TABLE_TOP_XP = get_xp_for_level(LEVEL_TABLE_MAX)
+MAX_XP = TABLE_TOP_XP + 10 ** 9
+
+
+def _level_by_loop(xp: int, level: int = 1) -> int:
+    """The original get_level_from_xp, optionally resumed from a known level"""
+    while get_xp_for_level(level + 1) <= xp:
+        level += 1
+    return level
+
+
+def test_every_threshold_and_its_neighbours():
+    for level in range(2, _level_by_loop(MAX_XP, LEVEL_TABLE_MAX) + 2):
+        threshold = get_xp_for_level(level)
+        assert get_level_from_xp(threshold - 1) == level - 1, threshold
+        assert get_level_from_xp(threshold) == level, threshold
+        assert get_level_from_xp(threshold + 1) == level, threshold
+
+
+def test_small_xp_matches_the_loop():
+    for xp in range(0, 5000):
+        assert get_level_from_xp(xp) == _level_by_loop(xp), xp
+
+
+@pytest.mark.parametrize("low, high", [
+    (0, TABLE_TOP_XP),
+    (TABLE_TOP_XP, MAX_XP),
+])
+def test_random_xp_matches_the_loop(low, high):
+    rng = random.Random(f"{low}-{high}")
+    samples = sorted(rng.randrange(low, high) for _ in range(SAMPLES))
+
+    expected, level = [], 1
+    for xp in samples:
+        # Same loop as before, resumed from the previous (smaller) sample's level
+        level = _level_by_loop(xp, level)
+        expected.append(level)
+
+    assert [get_level_from_xp(xp) for xp in samples] == expected
+    assert get_levels_from_xp(samples) == expected
@@ -0,0 +1,52 @@
+"""
+Plan cache hits only write last_used_at once it has gone stale
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+
+from database import SessionLocal, engine
+from models import AIPlanCache
+from plan_cache import AI_PLAN_CACHE_TOUCH_SECONDS, get_cached_plan, store_plan
+
+
+def _hit(user_id: int) -> list:
+    """Look the plan up and return the UPDATE statements it ran"""
+    updates = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("UPDATE"):
+            updates.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with SessionLocal() as db:
+            assert get_cached_plan(db, user_id, "key") == "plan"
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    return updates
+
+
+def _last_used_at(db, user_id: int) -> datetime:
+    return db.query(AIPlanCache.last_used_at).filter(AIPlanCache.user_id == user_id).scalar()
+
+
+def test_recent_hit_does_not_write(make_user):
+    user_id, _headers = make_user()
+    with SessionLocal() as db:
+        store_plan(db, user_id, "key", "plan")
+
+    assert _hit(user_id) == []
+
+
+def test_stale_hit_refreshes_last_used_at(make_user):
+    user_id, _headers = make_user()
+    stale = datetime.now(timezone.utc) - timedelta(seconds=AI_PLAN_CACHE_TOUCH_SECONDS + 60)
+    with SessionLocal() as db:
+        store_plan(db, user_id, "key", "plan")
+        db.query(AIPlanCache).filter(AIPlanCache.user_id == user_id).update({"last_used_at": stale})
+        db.commit()
+
+    assert len(_hit(user_id)) == 1
+    with SessionLocal() as db:
+        assert _last_used_at(db, user_id).replace(tzinfo=timezone.utc) > stale + timedelta(seconds=30)
@@ -0,0 +1,65 @@
+"""
+Every SELECT behind the dashboard, skills and tasks reads is served by an index
+
+Runs each read endpoint, captures the statements it sends to SQLite and
+fails on any EXPLAIN QUERY PLAN step that scans a table.
+"""
+import pytest
+from sqlalchemy import event
+
+from database import async_engine, engine
+
+PREFIXES = ("/dashboard", "/skills", "/tasks")
+
+# Backed by OpenAI rather than the database
+SKIPPED_PATHS = {"/dashboard/ai-recommendation", "/dashboard/ai-learning-plan", "/dashboard/ai-jobs/{job_id}"}
+
+
+def _read_paths(app, skill_id: int) -> list:
+    return [
+        route.path.replace("{skill_id}", str(skill_id))
+        for route in app.routes
+        if "GET" in getattr(route, "methods", ())
+        and route.path.startswith(PREFIXES) and route.path not in SKIPPED_PATHS
+    ]
+
+
+@pytest.fixture
+def captured_selects():
+    statements = {}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.setdefault(statement, parameters)
+
+    sync_engine = async_engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", capture)
+    yield statements
+    event.remove(sync_engine, "before_cursor_execute", capture)
+
+
+def _query_plan(statement: str, parameters) -> list:
+    with engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+
+
+def test_read_endpoints_do_not_scan_tables(app, client, make_user, captured_selects):
+    _user_id, headers = make_user()
+    skill_id = client.post("/skills/", headers=headers, json={"name": "Skill"}).json()["id"]
+    for i in range(3):
+        task_id = client.post(f"/tasks/{skill_id}", headers=headers, json={"title": f"Task {i}"}).json()["id"]
+        if i == 0:
+            client.put(f"/tasks/{task_id}/complete", headers=headers)
+    captured_selects.clear()
+
+    for path in _read_paths(app, skill_id):
+        assert client.get(path, headers=headers).status_code == 200, path
+
+    assert captured_selects
+    scans = {
+        statement: steps
+        for statement, parameters in captured_selects.items()
+        for steps in [[s for s in _query_plan(statement, parameters) if s.startswith("SCAN")]]
+        if steps
+    }
+    assert not scans, "\n\n".join(f"{' '.join(s.split())}\n  {steps}" for s, steps in scans.items())
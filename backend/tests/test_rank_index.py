@@ -0,0 +1,68 @@
+"""
+The leaderboard picks up XP written by other worker processes
+"""
+from sqlalchemy import update
+
+from database import SessionLocal
+from models import User
+from rank_index import RankIndex, rank_index, refresh_rank_index
+
+
+def _write_xp_elsewhere(user_id: int, xp: int) -> None:
+    """Change XP the way another worker would: in the database, not in this index"""
+    with SessionLocal() as db:
+        db.execute(update(User).where(User.id == user_id).values(xp_points=xp))
+        db.commit()
+
+
+def test_background_reload_picks_up_other_workers(client, make_user):
+    _user_id, headers = make_user(xp_points=10)
+    other_id, _other_headers = make_user(xp_points=5)
+    _write_xp_elsewhere(other_id, 10 ** 9)
+
+    # Requests never reload the index themselves
+    client.get("/dashboard/leaderboard/me", headers=headers)
+    assert rank_index.xp(other_id) == 5
+
+    refresh_rank_index()
+    top = client.get("/dashboard/leaderboard?limit=1", headers=headers).json()
+    assert top[0]["xp_points"] == 10 ** 9
+    assert rank_index.rank(other_id) == 1
+
+
+def test_writes_during_a_reload_survive_the_swap():
+    index = RankIndex()
+    index.load([(1, 10), (2, 20), (3, 30)])
+
+    def ordered_users():
+        # A snapshot read before these writes landed
+        yield 3, 30
+        index.update(1, 100)
+        index.remove(3)
+        yield 2, 20
+        yield 1, 10
+
+    index.reload(ordered_users)
+    assert index.top(10) == [(1, 1, 100), (2, 2, 20)]
+    assert len(index) == 2
+
+
+def test_reload_builds_the_same_index_as_load(make_user):
+    for xp in (0, 7, 7, 10 ** 6, None):
+        make_user(xp_points=xp)
+    refresh_rank_index()
+    reloaded = rank_index.top(len(rank_index))
+
+    with SessionLocal() as db:
+        expected = RankIndex()
+        expected.load(db.query(User.id, User.xp_points))
+    assert reloaded == expected.top(len(expected))
+
+
+def test_my_rank_uses_my_current_xp(client, make_user):
+    user_id, headers = make_user(xp_points=0)
+    _write_xp_elsewhere(user_id, 10 ** 12)
+
+    me = client.get("/dashboard/leaderboard/me", headers=headers).json()
+    assert me["rank"] == 1
+    assert me["xp_points"] == 10 ** 12
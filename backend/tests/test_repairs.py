@@ -0,0 +1,28 @@
+"""
+Repair commands invalidate the dashboard ETags of the users they rewrite
+"""
+import pytest
+
+from database import SessionLocal
+from skill_stats import recompute_task_counters
+from trends import backfill_daily_rollups
+
+
+@pytest.mark.parametrize("repair, path", [
+    (recompute_task_counters, "/dashboard/overview"),
+    (lambda db: backfill_daily_rollups(db, completions=True), "/dashboard/weekly-progress"),
+])
+def test_repair_changes_the_etag(client, make_user, repair, path):
+    _user_id, headers = make_user()
+    skill_id = client.post("/skills/", headers=headers, json={"name": "Skill"}).json()["id"]
+    client.post(f"/tasks/{skill_id}", headers=headers, json={"title": "Task"})
+
+    etag = client.get(path, headers=headers).headers["ETag"]
+    assert client.get(path, headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    with SessionLocal() as db:
+        repair(db)
+
+    response = client.get(path, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
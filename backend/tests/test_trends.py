@@ -0,0 +1,31 @@
+"""
+The daily activity rollup kept by the write paths matches a backfill
+"""
+from database import SessionLocal
+from trends import backfill_daily_rollups
+
+TREND_PATHS = ["/dashboard/weekly-progress", "/dashboard/activity-heatmap?days=7&format=columnar"]
+
+
+def _trends(client, headers: dict) -> list:
+    return [client.get(path, headers=headers).json() for path in TREND_PATHS]
+
+
+def test_deleted_skill_tasks_leave_the_rollup_as_a_backfill_would(client, make_user):
+    _user_id, headers = make_user()
+    kept, deleted = (
+        client.post("/skills/", headers=headers, json={"name": name}).json()["id"]
+        for name in ("Kept", "Deleted")
+    )
+    client.post(f"/tasks/{kept}/bulk", headers=headers, json={"tasks": [{"title": "Kept"}] * 2})
+    client.post(f"/tasks/{deleted}/bulk", headers=headers, json={"tasks": [{"title": "Gone"}] * 7})
+    client.post(f"/tasks/{deleted}", headers=headers, json={"title": "Gone too"})
+
+    assert client.delete(f"/skills/{deleted}", headers=headers).status_code == 200
+    incremental = _trends(client, headers)
+    assert sum(day["task_count"] for day in incremental[0]) == 2
+    assert client.get("/dashboard/overview", headers=headers).json()["total_tasks"] == 2
+
+    with SessionLocal() as db:
+        backfill_daily_rollups(db)
+    assert _trends(client, headers) == incremental
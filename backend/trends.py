@@ -0,0 +1,171 @@
+"""
+Trends Service - Task trends over time, read from the daily activity rollup
+
+daily_activities holds one row per user per day with tasks created and
+completed, minutes and XP, kept current by the task write paths (see
+gamification.log_daily_activity). A trend is one range scan on
+(user_id, date) summed into day, week or month buckets, however long the
+range and however many tasks the user has.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import bindparam, case, func, select, update
+from sqlalchemy.orm import Session
+
+from gamification import log_daily_activities
+from data_version import NEXT_DATA_VERSION
+from models import DailyActivity, Task, User
+
+
+TREND_GRANULARITIES = ("day", "week", "month")
+
+TREND_METRICS = ("tasks_created", "tasks_completed", "minutes_spent", "xp_earned")
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    """First day of the bucket containing ``day`` (weeks start on Monday)"""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(start: date, granularity: str) -> date:
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=1)
+
+
+def get_trend(db: Session, user: User, metric: str, start_date: date, end_date: date,
+              granularity: str = "day") -> list:
+    """``[(bucket_start, total), ...]`` of ``metric`` for ``start_date``..``end_date``.
+
+    Every bucket in the range is present, zero when the user was inactive.
+    Buckets are labelled by their first day, which for weeks and months may
+    fall before ``start_date``; only days inside the range are counted.
+    """
+    column = getattr(DailyActivity, metric)
+    rows = db.execute(select(DailyActivity.date, column).where(
+        DailyActivity.user_id == user.id,
+        DailyActivity.date >= start_date,
+        DailyActivity.date <= end_date
+    )).all()
+
+    totals = {}
+    bucket = bucket_start(start_date, granularity)
+    while bucket <= end_date:
+        totals[bucket] = 0
+        bucket = _next_bucket(bucket, granularity)
+
+    for day, value in rows:
+        totals[bucket_start(day, granularity)] += value or 0
+
+    return list(totals.items())
+
+
+# -------------------------------
+# Backfill from the Task table
+# -------------------------------
+def _as_date(value) -> date:
+    # func.date() returns a string on SQLite and a date on Postgres
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _created_day():
+    # UTC day of creation; gamification.activity_day files new tasks the same way
+    return func.date(Task.created_at)
+
+
+def remove_created_tasks(db: Session, *criteria) -> None:
+    """Take the tasks matching ``criteria`` out of tasks_created, on the days
+    the backfill would count them. Call before deleting the tasks; does not
+    commit."""
+    created_day = _created_day()
+    counts = db.execute(
+        select(Task.user_id, created_day, func.count(Task.id))
+        .where(Task.created_at.isnot(None), *criteria)
+        .group_by(Task.user_id, created_day)
+    ).all()
+    if not counts:
+        return
+
+    activities = DailyActivity.__table__
+    remaining = activities.c.tasks_created - bindparam("removed")
+    db.execute(
+        update(activities).where(
+            activities.c.user_id == bindparam("uid"),
+            activities.c.date == bindparam("day")
+        ).values(tasks_created=case((remaining > 0, remaining), else_=0)),
+        [{"uid": user_id, "day": _as_date(day), "removed": n} for user_id, day, n in counts]
+    )
+
+
+def backfill_daily_rollups(db: Session, completions: bool = False) -> None:
+    """Rebuild tasks_created per user per day from Task.created_at.
+
+    With ``completions`` the completed/minutes/XP counters are rebuilt from
+    Task.completed_at as well. That replaces the history logged at
+    completion time, so only use it when that history is known to be wrong.
+    Bumps the data version of every user with a rollup row.
+    """
+    columns = ["tasks_created"]
+    if completions:
+        columns += ["tasks_completed", "minutes_spent", "xp_earned"]
+
+    db.execute(update(DailyActivity).values(
+        {column: 0 for column in columns}
+    ).execution_options(synchronize_session=False))
+
+    # (user_id, day) -> [tasks_completed, minutes_spent, xp_earned, tasks_created]
+    entries = {}
+
+    created_day = _created_day()
+    for user_id, day, created in db.execute(
+        select(Task.user_id, created_day, func.count(Task.id))
+        .where(Task.created_at.isnot(None))
+        .group_by(Task.user_id, created_day)
+    ):
+        entries.setdefault((user_id, _as_date(day)), [0, 0, 0, 0])[3] = created
+
+    if completions:
+        completed_day = func.date(Task.completed_at)
+        for user_id, day, completed, minutes, xp in db.execute(
+            select(
+                Task.user_id, completed_day, func.count(Task.id),
+                func.sum(func.coalesce(Task.estimated_minutes, 0)),
+                func.sum(func.coalesce(Task.xp_reward, 0))
+            )
+            .where(Task.is_completed == True, Task.completed_at.isnot(None))
+            .group_by(Task.user_id, completed_day)
+        ):
+            entries.setdefault((user_id, _as_date(day)), [0, 0, 0, 0])[:3] = [completed, minutes, xp]
+
+    # The rebuilt columns are zero now, so the additive upsert sets them
+    log_daily_activities(db, [(user_id, day, *counters) for (user_id, day), counters in entries.items()])
+
+    # Every user with a rollup row may have new numbers; drop their ETags
+    db.execute(update(User).where(
+        User.id.in_(select(DailyActivity.user_id).distinct())
+    ).values(data_version=NEXT_DATA_VERSION).execution_options(synchronize_session=False))
+    db.commit()
+
+
+if __name__ == "__main__":
+    # Backfill command: python trends.py [--completions]
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild the daily activity rollup from the task table")
+    parser.add_argument("--completions", action="store_true",
+                        help="also rebuild completed tasks, minutes and XP from Task.completed_at")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        backfill_daily_rollups(db, completions=args.completions)
+        print("Daily rollups rebuilt")
+    finally:
+        db.close()
@@ -3,6 +3,7 @@ import { useNavigate } from 'react-router-dom';
 import '../App.css';
 
 const API_URL = 'http://localhost:8000';
+const TASK_PAGE_SIZE = 50;
 
 const CATEGORIES = [
   { value: 'programming', label: '💻 Programming', color: '#3498db' },
@@ -23,6 +24,7 @@ function Dashboard() {
   const [skills, setSkills] = useState([]);
   const [selectedSkill, setSelectedSkill] = useState(null);
   const [tasks, setTasks] = useState([]);
+  const [tasksCursor, setTasksCursor] = useState(null);
   const [heatmapData, setHeatmapData] = useState([]);
   const [weakAreas, setWeakAreas] = useState([]);
   const [aiPlan, setAiPlan] = useState('');
@@ -57,7 +59,34 @@ function Dashboard() {
     setTimeout(() => setNotification(null), 3000);
   };
 
+  // Heatmap arrives columnar (start date + parallel arrays); expand it for rendering
+  const expandHeatmap = (cols) => {
+    const start = new Date(`${cols.start}T00:00:00Z`);
+    return cols.tasks_completed.map((tasks, i) => ({
+      date: new Date(start.getTime() + i * 86400000).toISOString().slice(0, 10),
+      tasks_completed: tasks,
+      minutes_spent: cols.minutes_spent[i],
+      xp_earned: cols.xp_earned[i],
+      intensity: cols.intensity[i]
+    }));
+  };
+
   // Fetch functions
+  const fetchBundle = async () => {
+    try {
+      const sections = 'overview,user-stats,skills,activity-heatmap,weak-areas';
+      const res = await fetch(`${API_URL}/dashboard/bundle?sections=${sections}&heatmap_days=90&heatmap_format=columnar`, { headers: authHeaders });
+      if (res.ok) {
+        const data = await res.json();
+        setOverview(data['overview']);
+        setUserStats(data['user-stats']);
+        setSkills(data['skills']);
+        setHeatmapData(expandHeatmap(data['activity-heatmap']));
+        setWeakAreas(data['weak-areas']);
+      }
+    } catch (err) { console.error(err); }
+  };
+
   const fetchOverview = async () => {
     try {
       const res = await fetch(`${API_URL}/dashboard/overview`, { headers: authHeaders });
@@ -74,39 +103,51 @@ function Dashboard() {
 
   const fetchSkills = async () => {
     try {
-      const res = await fetch(`${API_URL}/skills/`, { headers: authHeaders });
-      if (res.ok) setSkills(await res.json());
+      // The sidebar shows every skill, so follow the cursor to the last page
+      let all = [];
+      let cursor = null;
+      do {
+        const query = `limit=500${cursor ? `&cursor=${cursor}` : ''}`;
+        const res = await fetch(`${API_URL}/skills/?${query}`, { headers: authHeaders });
+        if (!res.ok) return;
+        all = all.concat(await res.json());
+        cursor = res.headers.get('X-Next-Cursor');
+      } while (cursor);
+      setSkills(all);
     } catch (err) { console.error(err); }
   };
 
-  const fetchTasks = async (skillId) => {
+  const fetchTasks = async (skillId, cursor = null) => {
     try {
-      const res = await fetch(`${API_URL}/tasks/${skillId}`, { headers: authHeaders });
-      if (res.ok) setTasks(await res.json());
+      const query = `limit=${TASK_PAGE_SIZE}${cursor ? `&cursor=${cursor}` : ''}`;
+      const res = await fetch(`${API_URL}/tasks/${skillId}?${query}`, { headers: authHeaders });
+      if (res.ok) {
+        const page = await res.json();
+        setTasks(prev => (cursor ? [...prev, ...page] : page));
+        setTasksCursor(res.headers.get('X-Next-Cursor'));
+      }
     } catch (err) { console.error(err); }
   };
 
   const fetchHeatmap = async () => {
     try {
-      const res = await fetch(`${API_URL}/dashboard/activity-heatmap?days=90`, { headers: authHeaders });
-      if (res.ok) setHeatmapData(await res.json());
-    } catch (err) { console.error(err); }
-  };
-
-  const fetchWeakAreas = async () => {
-    try {
-      const res = await fetch(`${API_URL}/dashboard/weak-areas`, { headers: authHeaders });
-      if (res.ok) setWeakAreas(await res.json());
+      const res = await fetch(`${API_URL}/dashboard/activity-heatmap?days=90&format=columnar`, { headers: authHeaders });
+      if (res.ok) setHeatmapData(expandHeatmap(await res.json()));
     } catch (err) { console.error(err); }
   };
 
   const fetchAIPlan = async () => {
     try {
-      const res = await fetch(`${API_URL}/dashboard/ai-recommendation`, { headers: authHeaders });
-      if (res.ok) {
-        const data = await res.json();
-        setAiPlan(data.recommendation || '');
+      // Start a background job, then long-poll until the plan is ready
+      let res = await fetch(`${API_URL}/dashboard/ai-jobs`, { method: 'POST', headers: authHeaders });
+      if (!res.ok) return;
+      let job = await res.json();
+      while (job.status === 'pending') {
+        res = await fetch(`${API_URL}/dashboard/ai-jobs/${job.job_id}?wait=25`, { headers: authHeaders });
+        if (!res.ok) return;
+        job = await res.json();
       }
+      setAiPlan(job.result || '');
     } catch (err) { console.error(err); }
   };
 
@@ -116,15 +157,10 @@ function Dashboard() {
     
     const loadData = async () => {
       setLoading(true);
-      await Promise.all([
-        fetchOverview(),
-        fetchUserStats(),
-        fetchSkills(),
-        fetchHeatmap(),
-        fetchWeakAreas(),
-        fetchAIPlan()
-      ]);
+      await fetchBundle();
       setLoading(false);
+      // The AI plan is slow, so it loads after the rest of the dashboard
+      fetchAIPlan();
     };
     loadData();
   }, [navigate, token]);
@@ -215,9 +251,11 @@ function Dashboard() {
       });
       
       if (res.ok) {
+        const task = await res.json();
         setNewTaskTitle('');
         setNewTaskXP(10);
-        await fetchTasks(selectedSkill.id);
+        // Tasks are listed oldest first; a new one belongs on the last page
+        if (!tasksCursor) setTasks(prev => [...prev, task]);
         await fetchOverview();
         showNotification('Task added!');
       }
@@ -233,7 +271,7 @@ function Dashboard() {
       
       if (res.ok) {
         const data = await res.json();
-        await fetchTasks(selectedSkill.id);
+        setTasks(prev => prev.map(t => (t.id === taskId ? { ...t, is_completed: true } : t)));
         await fetchOverview();
         await fetchUserStats();
         await fetchHeatmap();
@@ -608,6 +646,11 @@ function Dashboard() {
                           )}
                         </div>
                       ))}
+                      {tasksCursor && (
+                        <button onClick={() => fetchTasks(selectedSkill.id, tasksCursor)}>
+                          Load more
+                        </button>
+                      )}
                     </div>
                   )}
                 </>